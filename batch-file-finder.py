@@ -0,0 +1,174 @@
+# batch-file-finder.py
+##
+## A headless `network-file-finder.py` for scheduled (e.g. overnight) jobs.  It runs the very same
+## my_engine search, but prints NOTHING per row: the results go to 'match-list.csv' (and the checkpoint,
+## so an interrupted job can be re-run with --resume) and the job ends with a short plain-text summary,
+## including its throughput.  Errors go to stderr with a non-zero exit status for the scheduler.
+##
+## Filenames come from --column of the --worksheet Google Sheet, or with --kept-file-list from the
+## 'file-list.tmp' saved by an earlier run.
+
+import sys
+import time
+import getopt
+
+# Local packages
+import my_tree
+import my_matcher
+import my_sheets
+import my_engine
+import my_metrics
+
+# Globals
+column = 7     # Default column for filenames is 'G' = 7
+skip_rows = 1  # Default number of header rows to skip = 1
+sheet = False
+path = False
+significant = False
+kept_file_list = False
+grinnell = False
+walk_workers = 1
+engine_name = 'auto'
+shortlist_size = 0
+min_shortlist = 50
+match_workers = 1
+checkpoint_rows = 250
+resume = False
+match_cache_size = 100000
+metrics_file = False
+metrics = my_metrics.Metrics( )
+usage = "python3 batch-file-finder.py --help --kept-file-list --grinnell --resume --worksheet <worksheet URL> --column <filename column> --tree-path <network tree path> --regex <significant regex> --skip-rows <number of header rows to skip> --walk-workers <concurrent directory listings> --engine <auto|rapidfuzz|fuzzywuzzy> --shortlist <files per target> --min-shortlist <full scan below this> --workers <matching processes> --match-cache <results kept, 0 = off> --metrics <metrics JSON file>"
+
+
+# fail(message) - Report an error to stderr and stop with a non-zero exit status
+# ---------------------------------------------------------------------------------------
+def fail(message):
+  print(f"batch-file-finder: {message}", file=sys.stderr)
+  sys.exit(1)
+
+
+# get_filenames( ) - The target filenames, from 'file-list.tmp' with --kept-file-list, else from the --worksheet
+# ---------------------------------------------------------------------------------------
+def get_filenames( ):
+  if kept_file_list:
+    try:
+      return my_engine.read_file_list( )
+    except OSError as e:
+      fail(f"Unable to read '{my_engine.file_list_file}': {e}")
+
+  if not sheet:
+    fail("A --worksheet URL (or --kept-file-list) is required.")
+  try:
+    gid = my_sheets.extract_sheet_id_from_url(sheet)
+  except ValueError as e:
+    fail(e)
+  try:
+    filenames = my_sheets.SheetCache( ).worksheet(sheet, gid=gid).col_values(column)
+  except Exception as e:
+    fail(f"Unable to read the worksheet: {e}")
+  try:
+    my_engine.save_file_list(filenames)
+  except OSError as e:
+    fail(f"Unable to write '{my_engine.file_list_file}': {e}")
+  return filenames
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], 'hkgw:c:t:r:s:', ["help", "kept-file-list", "grinnell", "resume", "worksheet=", "column=", "tree-path=", "regex=", "skip-rows=", "walk-workers=", "engine=", "shortlist=", "min-shortlist=", "workers=", "match-cache=", "metrics="])
+  except getopt.GetoptError as e:
+    fail(f"{e}\n{usage}")
+
+  for opt, arg in opts:
+    if opt in ("-h", "--help"):
+      print(usage)
+      sys.exit( )
+    elif opt in ("-w", "--worksheet"):
+      sheet = arg
+    elif opt in ("-c", "--column"):
+      column = my_sheets.column_number(arg)
+      if not column:
+        fail("Column must be a string using only letters A through Z.")
+    elif opt in ("-t", "--tree-path"):
+      path = arg
+    elif opt in ("-r", "--regex"):
+      significant = arg
+    elif opt in ("-k", "--kept-file-list"):
+      kept_file_list = True
+    elif opt in ("-g", "--grinnell"):
+      grinnell = True
+    elif opt == "--resume":
+      resume = True
+    elif opt == "--metrics":
+      metrics_file = arg
+    elif opt == "--engine":
+      if arg not in ('auto', *my_matcher.engines):
+        fail(f"Engine must be one of: auto, {', '.join(my_matcher.engines)}.")
+      engine_name = arg
+    else:
+      try:
+        val = int(arg)
+      except ValueError:
+        val = -1
+      minimum = 1 if opt in ("--walk-workers", "--workers") else 0
+      if val < minimum:
+        fail(f"{opt} must be an integer >= {minimum}.")
+      if opt in ("-s", "--skip-rows"):
+        skip_rows = val
+      elif opt == "--walk-workers":
+        walk_workers = val
+      elif opt == "--workers":
+        match_workers = val
+      elif opt == "--shortlist":
+        shortlist_size = val
+      elif opt == "--min-shortlist":
+        min_shortlist = val
+      else:
+        match_cache_size = val
+
+  if not path:
+    fail("A --tree-path is required.")
+
+  started = time.time( )
+  scan = my_tree.load_tree_async(path, walk_workers)
+  scan.add_done_callback(lambda done: metrics.add('tree_walk', time.time( ) - started))
+  with metrics.stage('sheets'):
+    filenames = get_filenames( )
+  (tree_index, tree) = scan.result( )
+  scanned = time.time( )
+  metrics.set('files_scanned', len(tree))
+  metrics.set('directories_listed', tree_index.relisted)
+  metrics.set('directories_unchanged', tree_index.reused)
+  if len(tree.names) == 0:
+    fail(f"The specified --tree-path of '{path}' returned NO files!")
+
+  (targets, skipped) = my_engine.build_targets(filenames, skip_rows, grinnell)
+  search = my_engine.Search(tree, targets, significant, engine_name, shortlist_size, min_shortlist, match_workers,
+                            match_cache_size, resume, grinnell, skip_rows, checkpoint_rows, output_to_csv=True, metrics=metrics)
+
+  matched = 0
+  for row in search.rows( ):
+    if row.csv_line[4] != 'NO match':
+      matched += 1
+  message = search.save_cache( )
+  if message:
+    print(message, file=sys.stderr)
+
+  print(f"Tree '{path}': {len(tree)} files, {tree_index.relisted} directories listed, {tree_index.reused} unchanged, {scanned - started:.1f}s.")
+  print(f"Matched {len(targets)} targets ({matched} with a match) using the '{search.engine.name}' engine in {search.finished - search.started:.1f}s, {search.rate( ):.1f} rows/s.")
+  for line in search.summary( ):
+    print(line)
+  print(f"Results saved in 'match-list.csv', {time.time( ) - started:.1f}s in all.")
+
+  metrics.finish( )
+  for line in metrics.report( ):
+    print(f"  {line}")
+  if metrics_file:
+    try:
+      metrics.save(metrics_file)
+      print(f"Metrics saved in '{metrics_file}'.")
+    except OSError as e:
+      print(f"Unable to save the metrics in '{metrics_file}': {e}", file=sys.stderr)
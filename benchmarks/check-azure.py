@@ -0,0 +1,208 @@
+# check-azure.py
+##
+## Call-counting checks of my_azure.Uploader against the local fake blob service in fake_blob.py, no
+## storage account needed: result order with any number of workers, concurrent uploads, retries with
+## backoff, prefetched container listings, files wanted by more than one row, and the manifest's hashing of
+## changed files.  Each check uploads a few small local files and compares the URLs returned, the
+## Uploader's counts and the calls the fake saw with those expected.  Prints one line per check and exits non-zero if any check fails.
+##
+## python3 benchmarks/check-azure.py
+
+import os
+import sys
+import shutil
+import tempfile
+import contextlib
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_azure
+import fake_blob
+
+objects = 40         # Files uploaded by each check
+file_bytes = 1000
+failures = [ ]
+
+
+# expect(check, what, got, wanted) - Record a failure of `check` unless got == wanted
+# ---------------------------------------------------------------------------------------
+def expect(check, what, got, wanted):
+  if got != wanted:
+    failures.append(check)
+    print(f"  FAILED {check}: {what} is {got!r}, expected {wanted!r}")
+
+
+# make_rows(folder) - Write `objects` _OBJ files into `folder`, returning match-list.csv rows naming them
+# ---------------------------------------------------------------------------------------
+def make_rows(folder):
+  rows = [ ]
+  for n in range(1, objects + 1):
+    name = f"grinnell_{n:05d}_OBJ.tiff"
+    with open(os.path.join(folder, name), 'wb') as f:
+      f.write(b'\0' * file_bytes)
+    rows.append([f"{n}", f"grinnell_{n:05d}", 'None', '95', name, folder] + [''] * 6 + ['stem'])
+  return rows
+
+
+# copy(rows, service, workers, retries, prefetch, manifest) - Uploader.copy_rows( ) of `rows`, quietly, after
+# a prefetch( ) of the listings if `prefetch`, returning (URL triples, Uploader)
+# ---------------------------------------------------------------------------------------
+def copy(rows, service, workers=1, retries=3, prefetch=False, manifest=None):
+  uploader = my_azure.Uploader(service, workers, retries, backoff=0.001, manifest=manifest)
+  with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    if prefetch:
+      uploader.prefetch(rows)
+    urls = list(uploader.copy_rows(rows))
+  return (urls, uploader)
+
+
+# expected_urls(rows) - The object_urls.csv triples of `rows` when every upload succeeds
+# ---------------------------------------------------------------------------------------
+def expected_urls(rows):
+  return [[my_azure.container_for(row[4])[1], '', ''] for row in rows]
+
+
+# Eight workers give the same URLs, in the same row order, as one
+def check_order(rows):
+  (serial, uploader) = copy(rows, fake_blob.FakeBlobService( ), 1)
+  (parallel, uploader) = copy(rows, fake_blob.FakeBlobService( ), 8)
+  expect('order', 'one worker', serial, expected_urls(rows))
+  expect('order', 'eight workers', parallel, serial)
+
+
+# Rows are uploaded concurrently, never more than `workers` at a time, each with one exists( ) and one upload
+def check_concurrency(rows):
+  for workers in (1, 8):
+    service = fake_blob.FakeBlobService(latency=0.01)
+    (urls, uploader) = copy(rows, service, workers)
+    expect('concurrency', f"calls with {workers} workers", service.calls, {'exists': objects, 'upload_blob': objects})
+    expect('concurrency', f"uploaded with {workers} workers", uploader.counts['uploaded'], objects)
+    expect('concurrency', f"calls in flight at once with {workers} workers", min(service.peak, 2), min(workers, 2))
+    expect('concurrency', f"more than {workers} calls in flight at once", service.peak > workers, False)
+
+
+# Transient errors are retried, and a file that uploads in the end counts as uploaded, with all its bytes
+def check_retry(rows):
+  service = fake_blob.FakeBlobService(fail_first=2)
+  (urls, uploader) = copy(rows, service, 4, retries=3)
+  expect('retry', 'URLs', urls, expected_urls(rows))
+  expect('retry', 'upload_blob calls', service.calls['upload_blob'], 3 * objects)
+  expect('retry', 'counts', uploader.counts, {'uploaded': objects, 'skipped': 0, 'failed': 0, 'remote_calls': 4 * objects,
+                                              'bytes': objects * file_bytes})
+  expect('retry', 'bytes received', service.bytes, objects * file_bytes)
+
+
+# After `retries` more tries a file is given up on: it fails, with no URL
+def check_give_up(rows):
+  service = fake_blob.FakeBlobService(fail_first=5)
+  (urls, uploader) = copy(rows, service, 4, retries=2)
+  expect('give_up', 'URLs', urls, [['', '', '']] * objects)
+  expect('give_up', 'upload_blob calls', service.calls['upload_blob'], 3 * objects)
+  expect('give_up', 'failed', uploader.counts['failed'], objects)
+
+
+# Errors that are not transient are not retried, and only their own row loses its URL
+def check_permanent(rows):
+  refused = rows[9][4]
+  service = fake_blob.FakeBlobService(refuse=[refused])
+  (urls, uploader) = copy(rows, service, 4)
+  wanted = expected_urls(rows)
+  wanted[9] = ['', '', '']
+  expect('permanent', 'URLs', urls, wanted)
+  expect('permanent', 'attempts at the refused blob', service.attempts[('objs', refused)], 1)
+  expect('permanent', 'uploaded and failed', (uploader.counts['uploaded'], uploader.counts['failed']), (objects - 1, 1))
+
+
+# With the listings prefetched there are no exists( ) calls, and only the files not yet stored are uploaded
+def check_prefetch(rows):
+  service = fake_blob.FakeBlobService( )
+  for row in rows[::2]:
+    service.store(('objs', row[4]), file_bytes)
+  (urls, uploader) = copy(rows, service, 4, prefetch=True)
+  expect('prefetch', 'URLs', urls, expected_urls(rows))
+  expect('prefetch', 'calls', service.calls, {'list_blobs': 1, 'upload_blob': objects // 2})
+  expect('prefetch', 'uploaded and skipped', (uploader.counts['uploaded'], uploader.counts['skipped']), (objects // 2, objects // 2))
+
+
+# A file wanted by two rows is uploaded once; the second row waits for that upload and reports its URL
+def check_duplicates(rows):
+  for prefetch in (False, True):
+    service = fake_blob.FakeBlobService(latency=0.01)
+    (urls, uploader) = copy([row for row in rows for twice in (1, 2)], service, 8, prefetch=prefetch)
+    expect('duplicates', f"URLs, prefetch={prefetch}", urls, [url for url in expected_urls(rows) for twice in (1, 2)])
+    expect('duplicates', f"upload_blob calls, prefetch={prefetch}", service.calls['upload_blob'], objects)
+    expect('duplicates', f"uploaded and skipped, prefetch={prefetch}", (uploader.counts['uploaded'], uploader.counts['skipped']), (objects, objects))
+
+
+# When that first upload fails, the waiting row does not report the file as stored: it tries the upload itself,
+# and only a file really in storage gets a URL and a manifest entry
+def check_duplicate_failure(rows):
+  for prefetch in (False, True):
+    manifest = my_azure.Manifest(os.path.join(rows[0][5], f"manifest-{prefetch}.json"))
+    service = fake_blob.FakeBlobService(latency=0.01, fail_first=1)
+    (urls, uploader) = copy([row for row in rows for twice in (1, 2)], service, 8, retries=0, prefetch=prefetch, manifest=manifest)
+    wanted = expected_urls(rows)
+    expect('duplicate_failure', f"one URL per pair, prefetch={prefetch}", [sorted(urls[i:i + 2]) for i in range(0, len(urls), 2)],
+           [[['', '', ''], url] for url in wanted])
+    expect('duplicate_failure', f"upload_blob calls, prefetch={prefetch}", service.calls['upload_blob'], 2 * objects)
+    expect('duplicate_failure', f"manifest entries, prefetch={prefetch}", sorted(manifest.entries), sorted(f"objs/{row[4]}" for row in rows))
+    refused = fake_blob.FakeBlobService(latency=0.01, refuse=[rows[0][4]])
+    manifest.entries = { }
+    (urls, uploader) = copy([rows[0], rows[0]], refused, 2, retries=0, prefetch=prefetch, manifest=manifest)
+    expect('duplicate_failure', f"URLs of a refused file, prefetch={prefetch}", urls, [['', '', '']] * 2)
+    expect('duplicate_failure', f"manifest of a refused file, prefetch={prefetch}", manifest.entries, { })
+
+
+# A file changed since its upload, with the same size but a new mtime, is read for its sha256 once, not again
+# before the upload; a file only touched is hashed once and not uploaded
+def check_manifest_hashing(rows):
+  manifest = my_azure.Manifest(os.path.join(rows[0][5], 'manifest-hashing.json'))
+  service = fake_blob.FakeBlobService( )
+  copy(rows, service, 4, manifest=manifest)
+  (changed, touched) = (rows[:objects // 2], rows[objects // 2:])
+  for row in rows:
+    path = os.path.join(row[5], row[4])
+    if row in changed:
+      with open(path, 'wb') as f:
+        f.write(b'\1' * file_bytes)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+  hashed = [ ]
+  file_sha256 = my_azure.file_sha256
+  my_azure.file_sha256 = lambda path: hashed.append(path) or file_sha256(path)
+  try:
+    (urls, uploader) = copy(rows, service, 4, manifest=manifest)
+  finally:
+    my_azure.file_sha256 = file_sha256
+  expect('manifest_hashing', 'URLs', urls, expected_urls(rows))
+  expect('manifest_hashing', 'files hashed', sorted(hashed), sorted(os.path.join(row[5], row[4]) for row in rows))
+  expect('manifest_hashing', 'uploaded and skipped', (uploader.counts['uploaded'], uploader.counts['skipped']), (len(changed), len(touched)))
+  expect('manifest_hashing', 'digest recorded', manifest.entries[f"objs/{rows[0][4]}"]['sha256'], file_sha256(os.path.join(rows[0][5], rows[0][4])))
+  make_rows(rows[0][5])   # put the files back as the other checks expect them
+
+
+checks = [check_order, check_concurrency, check_retry, check_give_up, check_permanent, check_prefetch, check_duplicates,
+          check_duplicate_failure, check_manifest_hashing]
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  folder = tempfile.mkdtemp(prefix='nff-check-azure-')
+  try:
+    rows = make_rows(folder)
+    for check in checks:
+      failed = len(failures)
+      check(rows)
+      print(f"  {'ok' if len(failures) == failed else 'FAILED'}  {check.__name__}")
+  finally:
+    shutil.rmtree(folder, ignore_errors=True)
+
+  if failures:
+    print(f"{len(set(failures))} of {len(checks)} checks failed.")
+    sys.exit(1)
+  print(f"All {len(checks)} checks passed.")
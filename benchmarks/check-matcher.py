@@ -0,0 +1,94 @@
+# check-matcher.py
+##
+## Checks of my_matcher.SignificantIndex against the per-target filter it replaced, no network tree needed:
+## for every target, the files subset( ) picks must be exactly those the old build_lists_and_dict( ) kept,
+## the files where a re.search( ) of the target's significant string finds it.  The files are a synthetic
+## tree shaped like ours (see synthetic.py) plus names holding the significant string somewhere other than
+## their first match.  Prints one line per check and exits non-zero if any check fails.
+##
+## python3 benchmarks/check-matcher.py
+
+import os
+import re
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_matcher
+import synthetic
+
+objects = 2000
+failures = [ ]
+
+
+# expect(check, what, got, wanted) - Record a failure of `check` unless got == wanted
+# ---------------------------------------------------------------------------------------
+def expect(check, what, got, wanted):
+  if got != wanted:
+    failures.append(check)
+    print(f"  FAILED {check}: {what} is {got!r}, expected {wanted!r}")
+
+
+# old_subset(regex, target, choices) - Indices of the files the old per-target re.search( ) filter kept,
+# or None if the target has no significant string
+# ---------------------------------------------------------------------------------------
+def old_subset(regex, target, choices):
+  match = re.compile(regex if '(' in regex else f"({regex})").search(target)
+  if not match:
+    return None
+  pattern = re.compile(f"({match.group( )})")
+  return [i for i, f in enumerate(choices) if pattern.search(f)]
+
+
+# compare(check, regex, targets, choices) - Expect subset( ) to give the old filter's files for every target
+# ---------------------------------------------------------------------------------------
+def compare(check, regex, targets, choices):
+  index = my_matcher.SignificantIndex(regex, choices)
+  for target in targets:
+    expect(check, f"subset of '{target}' for --regex '{regex}'", index.subset(target), old_subset(regex, target, choices))
+
+
+# A significant string after the first match in a name, or inside a longer run of digits, is still found
+def check_later_match( ):
+  choices = ['grinnell_3601_OBJ.tiff', 'x_2024_grinnell_3601.jpg', 'x_136012.jpg', 'grinnell_2024_OBJ.tiff', 'notes.txt']
+  index = my_matcher.SignificantIndex(r'\d{4}', choices)
+  expect('later_match', "subset of 'grinnell_3601'", index.subset('grinnell_3601'), [0, 1, 2])
+  expect('later_match', "subset of 'grinnell_2024'", index.subset('grinnell_2024'), [1, 3])
+  compare('later_match', r'\d{4}', ['grinnell_3601', 'grinnell_2024', 'grinnell_1360', 'grinnell_6012', 'grinnell_9999', 'notes'], choices)
+
+
+# Whether a file counts does not depend on which other files are in the tree
+def check_other_files( ):
+  alone = my_matcher.SignificantIndex(r'\d{4}', ['x_2024_grinnell_3601.jpg'])
+  expect('other_files', "subset of 'grinnell_3601' on its own", alone.subset('grinnell_3601'), [0])
+  crowd = my_matcher.SignificantIndex(r'\d{4}', ['x_2024_grinnell_3601.jpg', 'grinnell_3601_OBJ.tiff'])
+  expect('other_files', "subset of 'grinnell_3601' beside another match", crowd.subset('grinnell_3601'), [0, 1])
+
+
+# Over a synthetic tree and its worksheet targets, for the kinds of --regex we use
+def check_synthetic( ):
+  choices = [name for (dirname, name) in synthetic.tree_files(objects)]
+  choices += ['x_2024_grinnell_00360_OBJ.tiff', 'scan_1500079190_grinnell_00017.jpg', 'grinnell_00017_00360.tiff']
+  targets = synthetic.make_targets(objects, 300)[1:] + ['grinnell_00360', 'grinnell_00017', 'dg_1500079190']
+  for regex in (r'\d{4}', r'\d{5}', r'grinnell_\d{5}', r'_(\d{3})_'):
+    compare('synthetic', regex, targets, choices)
+
+
+checks = [check_later_match, check_other_files, check_synthetic]
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  for check in checks:
+    failed = len(failures)
+    check( )
+    print(f"  {'ok' if len(failures) == failed else 'FAILED'}  {check.__name__}")
+
+  if failures:
+    print(f"{len(set(failures))} of {len(checks)} checks failed.")
+    sys.exit(1)
+  print(f"All {len(checks)} checks passed.")
@@ -0,0 +1,122 @@
+# check-resume.py
+##
+## Checks of resuming an interrupted or cancelled search (my_engine.Search with resume=True, my_engine.Job
+## and my_results.Checkpoint), no network tree needed: a small FileTable is built in memory and every search
+## runs in a temporary directory, where it writes its match-list.csv and checkpoint.  Each check stops a
+## search after a few rows, resumes it, and compares the rows with those of the same search left
+## uninterrupted.  Prints one line per check and exits non-zero if any check fails.
+##
+## python3 benchmarks/check-resume.py
+
+import os
+import sys
+import shutil
+import tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_tree
+import my_engine
+import my_results
+
+targets = [f"foo_{n}x" for n in range(1, 7)]
+failures = [ ]
+
+
+# expect(check, what, got, wanted) - Record a failure of `check` unless got == wanted
+# ---------------------------------------------------------------------------------------
+def expect(check, what, got, wanted):
+  if got != wanted:
+    failures.append(check)
+    print(f"  FAILED {check}: {what} is {got!r}, expected {wanted!r}")
+
+
+# tree( ) - A FileTable of one directory holding a file for every target
+# ---------------------------------------------------------------------------------------
+def tree( ):
+  table = my_tree.FileTable( )
+  table.add_dir('tree/a', [f"foo_{n}.jpg" for n in range(1, 7)])
+  return table
+
+
+# search(regex, resume, stop_after, output_to_csv) - The csv_lines of a Search of `targets`, stopped after
+# `stop_after` rows if given
+# ---------------------------------------------------------------------------------------
+def search(regex=False, resume=False, stop_after=None, output_to_csv=True):
+  rows = [ ]
+  found = my_engine.Search(tree( ), targets, regex, match_cache_size=0, resume=resume, checkpoint_rows=2, output_to_csv=output_to_csv)
+  for row in found.rows( ):
+    rows.append(row.csv_line)
+    if len(rows) == stop_after:
+      break
+  return rows
+
+
+# An interrupted search, resumed, gives the rows of an uninterrupted one and re-uses only the rows it finished
+def check_resume( ):
+  wanted = search( )
+  search(stop_after=2)
+  expect('resume', 'rows', search(resume=True), wanted)
+  expect('resume', 'checkpoint left behind', os.path.exists(my_results.checkpoint_file), False)
+
+
+# A match-list.csv left by an earlier, finished search with other settings is not mixed into the resumed rows
+def check_stale_csv( ):
+  wanted = search( )
+  stale = search('x')
+  expect('stale_csv', 'rows of the other settings', stale[2][2:6], ['x', '0', 'NO match', 'NO match'])
+  search(stop_after=2, output_to_csv=False)   # match-list.csv of the finished 'x' search stays behind
+  expect('stale_csv', 'rows', search(resume=True), wanted)
+
+
+# A checkpoint written with other settings is not re-used at all
+def check_other_settings( ):
+  wanted = search( )
+  search('x', stop_after=2)
+  checkpoint = my_results.Checkpoint({'other': 'settings'})
+  expect('other_settings', 'rows re-used', checkpoint.resume(targets), { })
+  expect('other_settings', 'rows', search(resume=True), wanted)
+
+
+# A job cancelled mid-batch keeps the whole batch under way, stops there, and can be resumed
+def check_cancel( ):
+  wanted = search( )
+  job = my_engine.Job('check')
+
+  class Collected(list):   # the job's rows, cancelling it once the first one is in
+    def append(self, line):
+      super( ).append(line)
+      job.cancel( )
+
+  job.rows = Collected( )
+  job.follow(my_engine.Search(tree( ), targets, match_cache_size=0, checkpoint_rows=2))
+  expect('cancel', 'rows of the cancelled job', job.rows, wanted[:2])
+  expect('cancel', 'checkpoint left behind', os.path.exists(my_results.checkpoint_file), True)
+  expect('cancel', 'rows', search(resume=True), wanted)
+
+
+checks = [check_resume, check_stale_csv, check_other_settings, check_cancel]
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  cwd = os.getcwd( )
+  folder = tempfile.mkdtemp(prefix='nff-check-resume-')
+  try:
+    os.chdir(folder)
+    for check in checks:
+      failed = len(failures)
+      check( )
+      print(f"  {'ok' if len(failures) == failed else 'FAILED'}  {check.__name__}")
+  finally:
+    os.chdir(cwd)
+    shutil.rmtree(folder, ignore_errors=True)
+
+  if failures:
+    print(f"{len(set(failures))} of {len(checks)} checks failed.")
+    sys.exit(1)
+  print(f"All {len(checks)} checks passed.")
@@ -0,0 +1,161 @@
+# check-sheets.py
+##
+## Call-counting checks of my_sheets against the local fake gspread in fake_sheets.py, no Google account
+## needed: the SheetCache across reruns, TTL expiry and invalidation, and write_back( ) batching.  Each
+## check drives my_sheets the way the entry points do and compares the API calls the fake saw, and the
+## cells it was sent, with those expected.  Prints one line per check and exits non-zero if any check fails.
+##
+## python3 benchmarks/check-sheets.py
+
+import os
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_sheets
+import fake_sheets
+
+url = 'https://docs.google.com/spreadsheets/d/fake/edit#gid=55'
+header = ['Title', 'Creator', 'Date', 'Type', 'Format', 'Rights', 'Filename']
+failures = [ ]
+
+
+# expect(check, what, got, wanted) - Record a failure of `check` unless got == wanted
+# ---------------------------------------------------------------------------------------
+def expect(check, what, got, wanted):
+  if got != wanted:
+    failures.append(check)
+    print(f"  FAILED {check}: {what} is {got!r}, expected {wanted!r}")
+
+
+# sheets(ttl, latency) - A fake service with one two-tab spreadsheet, and a SheetCache using it
+# ---------------------------------------------------------------------------------------
+def sheets(ttl=600, latency=0.0):
+  service = fake_sheets.FakeSheetsService(latency)
+  service.add_worksheet(url, 'Summary', 0, [['Notes']])
+  service.add_worksheet(url, 'Objects', 55, [header] + [[f"Object {n}", '', '', '', '', '', f"grinnell_{n}_OBJ.tiff"] for n in range(1, 11)])
+  return (service, my_sheets.SheetCache(ttl, client_factory=service.client))
+
+
+# Streamlit reruns: every widget click lists the worksheets and reads the chosen one's header again
+def check_reruns( ):
+  (service, cache) = sheets( )
+  for rerun in range(5):
+    titles = [w.title for w in cache.worksheets(url)]
+    row = cache.header(url, 'Objects')
+  expect('reruns', 'worksheet titles', titles, ['Summary', 'Objects'])
+  expect('reruns', 'header', row, header)
+  expect('reruns', 'API calls', service.calls, {'authorize': 1, 'open_by_url': 1, 'worksheets': 1, 'row_values': 1})
+
+
+# A worksheet is picked from the cached list by title or by gid, with no further calls
+def check_lookup( ):
+  (service, cache) = sheets( )
+  expect('lookup', 'worksheet by gid', cache.worksheet(url, gid=55).title, 'Objects')
+  expect('lookup', 'worksheet by title', cache.worksheet(url, 'Summary').id, 0)
+  try:
+    cache.worksheet(url, 'Missing')
+    expect('lookup', 'unknown title', 'found', 'WorksheetNotFound')
+  except my_sheets.gs.WorksheetNotFound:
+    pass
+  expect('lookup', 'API calls', service.calls, {'authorize': 1, 'open_by_url': 1, 'worksheets': 1})
+
+
+# invalidate(url) re-fetches that spreadsheet but keeps the client, invalidate( ) drops the client too
+def check_invalidate( ):
+  (service, cache) = sheets( )
+  cache.header(url, 'Objects')
+  cache.invalidate(url)
+  cache.header(url, 'Objects')
+  expect('invalidate', 'API calls', service.calls, {'authorize': 1, 'open_by_url': 2, 'worksheets': 2, 'row_values': 2})
+  cache.invalidate( )
+  cache.worksheets(url)
+  expect('invalidate', 'API calls after invalidate( )', service.calls, {'authorize': 2, 'open_by_url': 3, 'worksheets': 3, 'row_values': 2})
+
+
+# Entries older than the TTL are fetched again
+def check_ttl( ):
+  (service, cache) = sheets(ttl=0.2)
+  cache.header(url, 'Objects')
+  cache.header(url, 'Objects')
+  time.sleep(0.3)
+  cache.header(url, 'Objects')
+  expect('ttl', 'API calls', service.calls, {'authorize': 2, 'open_by_url': 2, 'worksheets': 2, 'row_values': 2})
+
+
+# The filenames column is read in one call, through the same cached worksheet
+def check_column( ):
+  (service, cache) = sheets( )
+  cache.worksheets(url)
+  filenames = cache.worksheet(url, gid=55).col_values(7)
+  expect('column', 'filenames', filenames[:2], ['Filename', 'grinnell_1_OBJ.tiff'])
+  expect('column', 'API calls', service.calls, {'authorize': 1, 'open_by_url': 1, 'worksheets': 1, 'col_values': 1})
+
+
+# result(n, score) - The match-list.csv row of result n, from worksheet row n + 1
+# ---------------------------------------------------------------------------------------
+def result(n, score=95):
+  return [f"{n}", f"grinnell_{n}", 'None', f"{score}", f"grinnell_{n}_OBJ.tiff", '/mnt/objects'] + [''] * 6 + ['fuzzy']
+
+
+# write_back(col_count, results, first_column) - my_sheets.write_back( ) of `results` into a fake 'Objects'
+# worksheet `col_count` columns wide, returning (the worksheet, calls reported, calls the fake saw)
+# ---------------------------------------------------------------------------------------
+def write_back(col_count, results, first_column=8):
+  service = fake_sheets.FakeSheetsService( )
+  worksheet = service.add_worksheet(url, 'Objects', 55, [header] + [[''] * 6 + [f"grinnell_{n}_OBJ.tiff"] for n in range(1, len(results) + 1)], col_count)
+  calls = my_sheets.write_back(worksheet, results, first_column)
+  return (worksheet, calls, service.calls)
+
+
+# Results land beside the filenames, labelled in the header row, in ONE batch_update( )
+def check_write_back( ):
+  (worksheet, calls, seen) = write_back(26, [result(n) for n in range(1, 11)] + [result(11, 0)])
+  expect('write_back', 'calls reported', calls, 1)
+  expect('write_back', 'API calls', seen, {'batch_update': 1})
+  expect('write_back', 'header row', [worksheet.cell(1, c) for c in range(7, 11)], ['Filename', *my_sheets.write_back_header])
+  expect('write_back', 'row 2', [worksheet.cell(2, c) for c in range(7, 11)], ['grinnell_1_OBJ.tiff', 95, 'grinnell_1_OBJ.tiff', '/mnt/objects'])
+  expect('write_back', 'row 12', [worksheet.cell(12, c) for c in range(8, 11)], [0, 'grinnell_11_OBJ.tiff', '/mnt/objects'])
+
+
+# A grid too narrow for the three columns is widened first, with one add_cols( )
+def check_write_back_grid( ):
+  (worksheet, calls, seen) = write_back(8, [result(n) for n in range(1, 11)])
+  expect('write_back_grid', 'calls reported', calls, 2)
+  expect('write_back_grid', 'API calls', seen, {'add_cols': 1, 'batch_update': 1})
+  expect('write_back_grid', 'grid columns', worksheet.col_count, 10)
+
+
+# Thousands of rows, with gaps, go in a few batch_update( ) calls each under the payload limit
+def check_write_back_batches( ):
+  results = [result(n) for n in range(1, 25001) if n % 7000]
+  (worksheet, calls, seen) = write_back(26, results)
+  cells = sum(worksheet.updates)
+  expect('write_back_batches', 'cells sent', cells, 3 * (len(results) + 1))
+  expect('write_back_batches', 'largest call over the limit', max(worksheet.updates) > my_sheets.max_cells_per_call, False)
+  expect('write_back_batches', 'calls reported', calls, seen.get('batch_update'))
+  expect('write_back_batches', 'more calls than needed', calls > -(-cells // (my_sheets.max_cells_per_call - 3 * my_sheets.max_rows_per_range)), False)
+  expect('write_back_batches', 'row 25001', [worksheet.cell(25001, c) for c in range(8, 11)], [95, 'grinnell_25000_OBJ.tiff', '/mnt/objects'])
+  expect('write_back_batches', 'row 7001 (no result)', worksheet.cell(7001, 8), '')
+
+
+checks = [check_reruns, check_lookup, check_invalidate, check_ttl, check_column, check_write_back, check_write_back_grid,
+          check_write_back_batches]
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  for check in checks:
+    failed = len(failures)
+    check( )
+    print(f"  {'ok' if len(failures) == failed else 'FAILED'}  {check.__name__}")
+
+  if failures:
+    print(f"{len(set(failures))} of {len(checks)} checks failed.")
+    sys.exit(1)
+  print(f"All {len(checks)} checks passed.")
@@ -0,0 +1,127 @@
+# fake_blob.py
+##
+## A local, in-memory stand-in for the Azure BlobServiceClient, for timing and checking my_azure.Uploader
+## without a storage account.  It has the few methods the Uploader calls (see the my_azure header): container
+## listings by page, exists( ), upload_blob( ), stage_block( ) and commit_block_list( ).  Every call
+## sleeps `latency` seconds first to stand in for a network round trip, and is counted, as is the most calls
+## ever in flight at once.  Uploads can be set to fail: the first `fail_first` attempts at every blob with a
+## transient ConnectionError, and every attempt at a blob named in `refuse` with a PermissionError.
+
+import time
+import threading
+
+page_size = 5000   # Blobs per listing page, as Azure returns them
+
+
+class BlobProperties:
+
+  def __init__(self, name, size):
+    self.name = name
+    self.size = size
+
+
+class BlobPages:
+
+  def __init__(self, service, blobs):
+    self.service = service
+    self.blobs = blobs
+
+  def by_page(self):
+    for start in range(0, max(1, len(self.blobs)), page_size):
+      self.service.call('list_blobs')
+      yield iter(self.blobs[start:start + page_size])
+
+
+class FakeContainerClient:
+
+  def __init__(self, service, container):
+    self.service = service
+    self.container = container
+
+  def list_blobs(self, name_starts_with=None):
+    prefix = name_starts_with or ''
+    with self.service.lock:
+      blobs = [BlobProperties(blob, size) for (container, blob), size in sorted(self.service.blobs.items( ))
+               if container == self.container and blob.startswith(prefix)]
+    return BlobPages(self.service, blobs)
+
+
+class FakeBlobClient:
+
+  def __init__(self, service, container, blob):
+    self.service = service
+    self.key = (container, blob)
+
+  def exists(self):
+    self.service.call('exists')
+    with self.service.lock:
+      return self.key in self.service.blobs
+
+  def upload_blob(self, data, overwrite=False):
+    self.service.call('upload_blob')
+    self.service.fail(self.key)
+    self.service.store(self.key, len(data.read( )))
+
+  def stage_block(self, block_id, data, length=None):
+    self.service.call('stage_block')
+    with self.service.lock:
+      self.service.blocks.setdefault(self.key, { })[block_id] = len(data)
+      self.service.bytes += len(data)
+
+  def commit_block_list(self, block_ids):
+    self.service.call('commit_block_list')
+    self.service.fail(self.key)
+    with self.service.lock:
+      staged = self.service.blocks.pop(self.key, { })
+      self.service.blobs[self.key] = sum(staged[block_id] for block_id in block_ids)
+
+
+# FakeBlobService(latency, fail_first, refuse) - The service client: blob sizes by (container, blob), and counts
+# of every call
+# ---------------------------------------------------------------------------------------
+class FakeBlobService:
+
+  def __init__(self, latency=0.0, fail_first=0, refuse=( )):
+    self.latency = latency
+    self.fail_first = fail_first
+    self.refuse = set(refuse)
+    self.blobs = { }
+    self.blocks = { }
+    self.calls = { }
+    self.attempts = { }   # (container, blob): uploads tried
+    self.bytes = 0        # bytes received by upload_blob( ) and stage_block( )
+    self.active = 0
+    self.peak = 0         # most calls in flight at once
+    self.lock = threading.Lock( )
+
+  def call(self, what):
+    with self.lock:
+      self.calls[what] = self.calls.get(what, 0) + 1
+      self.active += 1
+      self.peak = max(self.peak, self.active)
+    try:
+      if self.latency:
+        time.sleep(self.latency)
+    finally:
+      with self.lock:
+        self.active -= 1
+
+  # fail(key) - Raise the error this attempt at uploading blob `key` is set up to get, if any
+  def fail(self, key):
+    with self.lock:
+      attempts = self.attempts[key] = self.attempts.get(key, 0) + 1
+    if key[1] in self.refuse:
+      raise PermissionError(f"Upload of '{key[1]}' refused")
+    if attempts <= self.fail_first:
+      raise ConnectionError(f"Connection reset uploading '{key[1]}' (attempt {attempts})")
+
+  def store(self, key, size):
+    with self.lock:
+      self.blobs[key] = size
+      self.bytes += size
+
+  def get_container_client(self, container):
+    return FakeContainerClient(self, container)
+
+  def get_blob_client(self, container, blob):
+    return FakeBlobClient(self, container, blob)
@@ -0,0 +1,117 @@
+# fake_sheets.py
+##
+## A local, in-memory stand-in for gspread, for checking my_sheets.SheetCache and write_back( ) without a
+## Google account.  FakeSheetsService.client is a client_factory for SheetCache: it returns a client with
+## open_by_url( ), whose spreadsheets have worksheets( ), whose worksheets have row_values( ), col_values( ),
+## add_cols( ) and batch_update( ).  Every call sleeps `latency` seconds first to stand in for an API round
+## trip, and is counted; each worksheet also keeps the number of cells sent by every batch_update( ).
+
+import time
+import threading
+import gspread as gs
+from gspread.utils import a1_to_rowcol
+
+
+class FakeWorksheet:
+
+  def __init__(self, service, title, gid, rows, col_count=26):
+    self.service = service
+    self.title = title
+    self.id = gid
+    self.rows = [list(row) for row in rows]
+    self.col_count = max([col_count, *(len(row) for row in rows)])
+    self.updates = [ ]   # cells sent by each batch_update( )
+
+  # cell(row, col) - One cell's value, '' if it is empty
+  def cell(self, row, col):
+    if row <= len(self.rows) and col <= len(self.rows[row - 1]):
+      return self.rows[row - 1][col - 1]
+    return ''
+
+  def row_values(self, row):
+    self.service.call('row_values')
+    return list(self.rows[row - 1]) if row <= len(self.rows) else [ ]
+
+  def col_values(self, col):
+    self.service.call('col_values')
+    values = [row[col - 1] if col <= len(row) else '' for row in self.rows]
+    while values and values[-1] == '':
+      values.pop( )   # gspread leaves out trailing empty cells
+    return values
+
+  def add_cols(self, cols):
+    self.service.call('add_cols')
+    self.col_count += cols
+
+  def batch_update(self, data, raw=True):
+    self.service.call('batch_update')
+    cells = 0
+    for item in data:
+      (first, last) = item['range'].split(':')
+      (row, col) = a1_to_rowcol(first)
+      if a1_to_rowcol(last)[1] > self.col_count:
+        raise ValueError(f"Range {item['range']} exceeds the grid limits of '{self.title}'")
+      for r, values in enumerate(item['values'], row):
+        while len(self.rows) < r:
+          self.rows.append([ ])
+        cells_row = self.rows[r - 1]
+        for c, value in enumerate(values, col):
+          cells_row.extend([''] * (c - len(cells_row)))
+          cells_row[c - 1] = value
+          cells += 1
+    self.updates.append(cells)
+
+
+class FakeSpreadsheet:
+
+  def __init__(self, service, url):
+    self.service = service
+    self.url = url
+
+  def worksheets(self):
+    self.service.call('worksheets')
+    with self.service.lock:
+      return list(self.service.spreadsheets[self.url])
+
+
+class FakeClient:
+
+  def __init__(self, service):
+    self.service = service
+
+  def open_by_url(self, url):
+    self.service.call('open_by_url')
+    with self.service.lock:
+      if url not in self.service.spreadsheets:
+        raise gs.SpreadsheetNotFound(url)
+    return FakeSpreadsheet(self.service, url)
+
+
+# FakeSheetsService(latency) - The spreadsheets, as lists of worksheets by URL, and counts of every call
+# ---------------------------------------------------------------------------------------
+class FakeSheetsService:
+
+  def __init__(self, latency=0.0):
+    self.latency = latency
+    self.spreadsheets = { }
+    self.calls = { }
+    self.lock = threading.Lock( )
+
+  def call(self, what):
+    if self.latency:
+      time.sleep(self.latency)
+    with self.lock:
+      self.calls[what] = self.calls.get(what, 0) + 1
+
+  # add_worksheet(url, title, gid, rows, col_count) - Add a worksheet holding `rows` (lists of cell values), its
+  # grid `col_count` columns wide, to a spreadsheet
+  def add_worksheet(self, url, title, gid, rows, col_count=26):
+    worksheet = FakeWorksheet(self, title, gid, rows, col_count)
+    with self.lock:
+      self.spreadsheets.setdefault(url, [ ]).append(worksheet)
+    return worksheet
+
+  # client( ) - The client_factory: one authorization, counted
+  def client(self):
+    self.call('authorize')
+    return FakeClient(self)
@@ -0,0 +1,281 @@
+# run-benchmarks.py
+##
+## Benchmarks the stages of a `network-file-finder.py` search, one at a time, on a synthetic tree and
+## target list shaped like ours (see synthetic.py):
+##
+##   walk_cold  - my_tree.load_tree( ) with no saved index, every directory listed
+##   walk_warm  - load_tree( ) again, the saved index re-used
+##   regex      - building the --regex SignificantIndex and finding each target's significant files
+##   index      - building the my_matcher.Matcher (stem, --regex and trigram indexes)
+##   match      - Matcher.match( ) of all targets, no match cache
+##   csv        - writing the rows to a match-list.csv with my_results.MatchListWriter
+##   upload     - --copy-to-azure --extended uploads with my_azure.Uploader to a local fake blob store
+##
+## Each stage is run --repeat times and its best time kept.  The results are saved as JSON, named for
+## the current git commit, so runs of different versions can be compared with --compare.  The memory held
+## by the scanned tree is measured separately, by tree-memory.py.
+##
+## python3 benchmarks/run-benchmarks.py --size small|medium|large --compare benchmarks/results/<older>.json
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_tree
+import my_matcher
+import my_results
+import my_azure
+import my_engine
+import synthetic
+import fake_blob
+
+# Globals
+sizes = {'small': 20000, 'medium': 200000, 'large': 1000000}   # Files in the synthetic tree
+size = 'small'
+files = sizes[size]
+target_count = 1000
+depth = 6
+fanout = 8
+pdf_every = 10
+file_bytes = 0
+seed = 0
+regex = r'(grinnell_\d+|dg_\d+)'
+engine_name = 'auto'
+shortlist_size = 0
+min_shortlist = 50
+match_workers = 1
+walk_workers = 4
+upload_workers = 8
+blob_latency_ms = 0
+repeat = 1
+data_dir = os.path.join(here, 'data')
+output = False
+compare = False
+regression = 1.10   # A stage this many times slower than in the --compare run is flagged
+usage = "python3 benchmarks/run-benchmarks.py --help --size <small|medium|large> --files <files in the tree> --targets <worksheet rows> --depth <directory levels> --fanout <directories per level> --file-bytes <bytes per _OBJ file> --seed <target seed> --regex <significant regex, '' = none> --engine <auto|rapidfuzz|fuzzywuzzy> --shortlist <files per target> --min-shortlist <full scan below this> --workers <matching processes> --walk-workers <concurrent directory listings> --upload-workers <concurrent uploads> --blob-latency <ms per fake blob call> --repeat <runs per stage> --data <tree folder> --output <results JSON> --compare <earlier results JSON>"
+
+
+# git_version( ) - The current git commit (with '-dirty' if there are local changes), or None
+# ---------------------------------------------------------------------------------------
+def git_version( ):
+  try:
+    return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=here, capture_output=True, text=True, check=True).stdout.strip( )
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+# timed(name, results, run) - Call run( ) --repeat times, recording the best time in results[name].  run( )
+# returns a dict of counts (e.g. {'items': n}), its last result is kept alongside the times.
+# ---------------------------------------------------------------------------------------
+def timed(name, results, run):
+  times = [ ]
+  for i in range(repeat):
+    started = time.perf_counter( )
+    counts = run( )
+    times.append(time.perf_counter( ) - started)
+  best = min(times)
+  stage = {'seconds': round(best, 4), 'runs': [round(t, 4) for t in times]}
+  stage.update(counts)
+  if counts.get('items'):
+    stage['rate'] = round(counts['items'] / best, 1) if best > 0 else None
+  results[name] = stage
+  rate = f", {stage['rate']} {counts.get('unit', 'items')}/s" if stage.get('rate') else ''
+  print(f"  {name:<10} {best:9.3f}s{rate}")
+  return stage
+
+
+# compare_results(new, old) - Print each stage's time against an earlier run, flagging regressions
+# ---------------------------------------------------------------------------------------
+def compare_results(new, old):
+  print(f"\nCompared with {old.get('version')} ({old.get('created')}):")
+  slower = 0
+  for name, stage in new['stages'].items( ):
+    before = old.get('stages', { }).get(name)
+    if not before or not before.get('seconds'):
+      print(f"  {name:<10} {stage['seconds']:9.3f}s  (not in the earlier run)")
+      continue
+    ratio = stage['seconds'] / before['seconds']
+    flag = '  SLOWER' if ratio > regression else ''
+    slower += 1 if flag else 0
+    print(f"  {name:<10} {stage['seconds']:9.3f}s vs {before['seconds']:9.3f}s  x{ratio:.2f}{flag}")
+  if old.get('settings') != new['settings']:
+    print("  (the two runs used different settings)")
+  return slower
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], 'h', ["help", "size=", "files=", "targets=", "depth=", "fanout=", "file-bytes=", "seed=", "regex=", "engine=", "shortlist=", "min-shortlist=", "workers=", "walk-workers=", "upload-workers=", "blob-latency=", "repeat=", "data=", "output=", "compare="])
+  except getopt.GetoptError as e:
+    print(f"{e}\n{usage}", file=sys.stderr)
+    sys.exit(2)
+
+  for opt, arg in opts:
+    if opt in ("-h", "--help"):
+      print(usage)
+      sys.exit( )
+    elif opt == "--size":
+      if arg not in sizes:
+        print(f"--size must be one of: {', '.join(sizes)}.", file=sys.stderr)
+        sys.exit(2)
+      size = arg
+      files = sizes[arg]
+    elif opt == "--regex":
+      regex = arg
+    elif opt == "--engine":
+      if arg not in ('auto', *my_matcher.engines):
+        print(f"--engine must be one of: auto, {', '.join(my_matcher.engines)}.", file=sys.stderr)
+        sys.exit(2)
+      engine_name = arg
+    elif opt == "--data":
+      data_dir = arg
+    elif opt == "--output":
+      output = arg
+    elif opt == "--compare":
+      compare = arg
+    else:
+      try:
+        val = int(arg)
+      except ValueError:
+        val = -1
+      minimum = 0 if opt in ("--file-bytes", "--seed", "--shortlist", "--min-shortlist", "--blob-latency") else 1
+      if val < minimum:
+        print(f"{opt} must be an integer >= {minimum}.", file=sys.stderr)
+        sys.exit(2)
+      if opt == "--files":
+        files = val
+        size = f"{val}-files"
+      elif opt == "--targets":
+        target_count = val
+      elif opt == "--depth":
+        depth = val
+      elif opt == "--fanout":
+        fanout = val
+      elif opt == "--file-bytes":
+        file_bytes = val
+      elif opt == "--seed":
+        seed = val
+      elif opt == "--shortlist":
+        shortlist_size = val
+      elif opt == "--min-shortlist":
+        min_shortlist = val
+      elif opt == "--workers":
+        match_workers = val
+      elif opt == "--walk-workers":
+        walk_workers = val
+      elif opt == "--upload-workers":
+        upload_workers = val
+      elif opt == "--blob-latency":
+        blob_latency_ms = val
+      else:
+        repeat = val
+
+  # The synthetic tree is generated once per set of parameters, and re-used after that
+  objects = synthetic.objects_for(files, pdf_every)
+  root = os.path.join(data_dir, f"tree-{objects}-{depth}-{fanout}-{file_bytes}")
+  print(f"Synthetic tree of about {files} files ({objects} objects) in '{root}'...")
+  started = time.perf_counter( )
+  (tree_files, generated) = synthetic.make_tree(root, objects, pdf_every, 24, depth, fanout, file_bytes)
+  print(f"  {'generated' if generated else 're-used'} {tree_files} files in {time.perf_counter( ) - started:.1f}s")
+
+  (targets, skipped) = my_engine.build_targets(synthetic.make_targets(objects, target_count, pdf_every, seed), 1, grinnell=True)
+  engine = my_matcher.get_engine(engine_name)
+  significant = regex or False
+  settings = {'size': size, 'files': tree_files, 'objects': objects, 'targets': len(targets), 'depth': depth, 'fanout': fanout,
+              'file_bytes': file_bytes, 'seed': seed, 'regex': significant, 'engine': engine.name, 'shortlist': [shortlist_size, min_shortlist],
+              'match_workers': match_workers, 'walk_workers': walk_workers, 'upload_workers': upload_workers,
+              'blob_latency_ms': blob_latency_ms, 'repeat': repeat}
+  stages = { }
+  work = tempfile.mkdtemp(prefix='nff-bench-')
+  index_folder = os.path.join(work, 'tree-index')
+  state = { }
+
+  print(f"\nTiming {len(targets)} targets against {tree_files} files, best of {repeat}:")
+  try:
+    def walk_cold( ):
+      shutil.rmtree(index_folder, ignore_errors=True)
+      (index, state['tree']) = my_tree.load_tree(root, walk_workers, index_folder)
+      return {'items': len(state['tree']), 'unit': 'files', 'directories': index.relisted}
+    timed('walk_cold', stages, walk_cold)
+
+    def walk_warm( ):
+      (index, state['tree']) = my_tree.load_tree(root, walk_workers, index_folder)
+      return {'items': len(state['tree']), 'unit': 'files', 'directories': index.reused}
+    timed('walk_warm', stages, walk_warm)
+    tree = state['tree']
+
+    if significant:
+      def regex_filter( ):
+        index = my_matcher.SignificantIndex(significant, tree.names)
+        subsets = [index.subset(target) for target in targets]
+        return {'items': len(targets), 'unit': 'targets', 'significant_files': sum(len(group) for group in index.groups.values( )),
+                'targets_with_subset': sum(1 for subset in subsets if subset is not None)}
+      timed('regex', stages, regex_filter)
+
+    def build_index( ):
+      state['matcher'] = my_matcher.Matcher(tree.names, engine, significant, shortlist_size, min_shortlist, match_workers)
+      return {'items': len(tree), 'unit': 'files'}
+    timed('index', stages, build_index)
+
+    def match( ):
+      matcher = state['matcher']   # its indexes were timed above, only matching is timed here
+      matcher.stem_hits = matcher.fuzzy_matched = matcher.full_scans = 0
+      results = matcher.match(targets)
+      state['rows'] = [my_engine.result_line(n, target, text, matches, method, tree)
+                       for n, (target, (text, matches, method)) in enumerate(zip(targets, results), 1)]
+      return {'items': len(targets), 'unit': 'targets', 'stem_hits': matcher.stem_hits,
+              'fuzzy_matched': matcher.fuzzy_matched, 'full_scans': matcher.full_scans}
+    timed('match', stages, match)
+    rows = state['rows']
+
+    def csv_output( ):
+      with my_results.MatchListWriter(os.path.join(work, 'match-list.csv')) as match_list:
+        for line in rows:
+          match_list.write(line)
+      return {'items': len(rows), 'unit': 'rows', 'bytes': os.path.getsize(os.path.join(work, 'match-list.csv'))}
+    timed('csv', stages, csv_output)
+
+    def upload( ):
+      service = fake_blob.FakeBlobService(blob_latency_ms / 1000.0)
+      uploader = my_azure.Uploader(service, upload_workers, siblings=my_matcher.SiblingMap(tree))
+      with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        uploader.prefetch(rows, extended=True)
+        for urls in uploader.copy_rows(rows, extended=True):
+          pass
+      return {'items': uploader.counts['uploaded'], 'unit': 'files', 'bytes': service.bytes,
+              'skipped': uploader.counts['skipped'], 'failed': uploader.counts['failed'], 'remote_calls': uploader.counts['remote_calls']}
+    timed('upload', stages, upload)
+
+  finally:
+    if 'matcher' in state:
+      state['matcher'].close( )
+    shutil.rmtree(work, ignore_errors=True)
+
+  results = {'benchmark': 'network-file-finder', 'version': git_version( ), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+             'python': platform.python_version( ), 'platform': platform.platform( ), 'cpus': os.cpu_count( ),
+             'settings': settings, 'stages': stages}
+  if not output:
+    output = os.path.join(here, 'results', f"{time.strftime('%Y%m%d-%H%M%S')}-{results['version'] or 'unknown'}-{size}.json")
+  os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+  with open(output, 'w') as f:
+    json.dump(results, f, indent=2)
+  print(f"\nResults saved in '{output}'.")
+
+  if compare:
+    with open(compare, 'r') as f:
+      if compare_results(results, json.load(f)):
+        sys.exit(1)
@@ -0,0 +1,121 @@
+# synthetic.py
+##
+## Synthetic directory trees and worksheet target lists shaped like ours, for `run-benchmarks.py`.
+##
+## A tree holds `objects` Grinnell objects, each as grinnell_NNNNN_OBJ.tiff with its _TN.jpg and _JPG.jpg
+## derivatives, plus one dg_<epoch>.pdf for every `pdf_every` objects.  Files are spread `per_dir` to a
+## directory under `depth` levels of box_NN/folder_NN/... directories, `fanout` per level, so the tree
+## is as deeply nested as our network mounts.  Everything is derived from the object number, so the same
+## parameters always give the same tree, and `seed` the same targets.
+
+import os
+import json
+import random
+import shutil
+
+marker_file = '.synthetic.json'   # Parameters of a generated tree, hidden from the tree walk
+epoch_base = 1500000000
+epoch_step = 7919
+level_names = ('collection', 'series', 'box', 'folder', 'item', 'part', 'set', 'group')
+
+
+# object_name(n) / pdf_name(n) - Base names of Grinnell object n and of PDF n
+# ---------------------------------------------------------------------------------------
+def object_name(n):
+  return f"grinnell_{n:05d}"
+
+def pdf_name(n):
+  return f"dg_{epoch_base + n * epoch_step}.pdf"
+
+
+# object_dir(n, per_dir, depth, fanout) - Relative directory holding the files of object n
+# ---------------------------------------------------------------------------------------
+def object_dir(n, per_dir=24, depth=6, fanout=8):
+  d = (n * 3) // per_dir
+  parts = [ ]
+  for level in reversed(range(depth)):   # innermost level first
+    parts.append(f"{level_names[level % len(level_names)]}_{d % fanout:02d}")
+    d //= fanout
+  parts.append(f"volume_{d:04d}")   # whatever is left over keeps directories from overfilling
+  return os.path.join(*reversed(parts))
+
+
+# tree_files(objects, pdf_every, per_dir, depth, fanout) - Yield (relative dir, filename) for every file
+# ---------------------------------------------------------------------------------------
+def tree_files(objects, pdf_every=10, per_dir=24, depth=6, fanout=8):
+  for n in range(1, objects + 1):
+    dirname = object_dir(n, per_dir, depth, fanout)
+    name = object_name(n)
+    yield (dirname, f"{name}_OBJ.tiff")
+    yield (dirname, f"{name}_TN.jpg")
+    yield (dirname, f"{name}_JPG.jpg")
+    if n % pdf_every == 0:
+      yield (dirname, pdf_name(n // pdf_every))
+
+
+# objects_for(files, pdf_every) - The number of objects giving a tree of about `files` files
+# ---------------------------------------------------------------------------------------
+def objects_for(files, pdf_every=10):
+  return max(1, int(files / (3 + 1 / pdf_every)))
+
+
+# make_tree(root, objects, pdf_every, per_dir, depth, fanout, file_bytes) - Create the tree under `root` unless
+# it is already there with the same parameters.  Every _OBJ.tiff holds `file_bytes` bytes, all other files
+# are empty.  Returns (number of files, True if the tree was (re)generated).
+# ---------------------------------------------------------------------------------------
+def make_tree(root, objects, pdf_every=10, per_dir=24, depth=6, fanout=8, file_bytes=0):
+  params = {'objects': objects, 'pdf_every': pdf_every, 'per_dir': per_dir, 'depth': depth, 'fanout': fanout, 'file_bytes': file_bytes}
+  marker = os.path.join(root, marker_file)
+  try:
+    with open(marker, 'r') as f:
+      saved = json.load(f)
+    if saved['params'] == params:
+      return (saved['files'], False)
+  except (OSError, ValueError, KeyError):
+    pass
+
+  if os.path.isdir(root):
+    shutil.rmtree(root)
+  os.makedirs(root)
+  payload = b'\0' * file_bytes
+  made = set( )
+  files = 0
+  for (dirname, filename) in tree_files(objects, pdf_every, per_dir, depth, fanout):
+    dirpath = os.path.join(root, dirname)
+    if dirname not in made:
+      os.makedirs(dirpath, exist_ok=True)
+      made.add(dirname)
+    with open(os.path.join(dirpath, filename), 'wb') as f:
+      if payload and filename.endswith('_OBJ.tiff'):
+        f.write(payload)
+    files += 1
+
+  with open(marker, 'w') as f:
+    json.dump({'params': params, 'files': files}, f)
+  return (files, True)
+
+
+# make_targets(objects, count, pdf_every, seed) - `count` worksheet filenames (after a header row) in the
+# mix our sheets have: exact names, bare object numbers, mangled names that need fuzzy matching, PDFs and
+# files that are not in the tree at all
+# ---------------------------------------------------------------------------------------
+def make_targets(objects, count, pdf_every=10, seed=0):
+  rnd = random.Random(seed)
+  pdfs = objects // pdf_every
+  targets = ['Filename']
+  for i in range(count):
+    n = rnd.randint(1, objects)
+    name = object_name(n)
+    kind = rnd.random( )
+    if kind < 0.35:
+      targets.append(f"{name}_OBJ.tiff")                      # exact
+    elif kind < 0.55:
+      targets.append(name)                                    # bare, --grinnell adds _OBJ.
+    elif kind < 0.75:
+      targets.append(f"Grinnell {n:05d} OBJ.tif")             # mangled, fuzzy
+    elif kind < 0.9 and pdfs:
+      m = rnd.randint(1, pdfs)
+      targets.append(pdf_name(m) if rnd.random( ) < 0.5 else pdf_name(m)[:-4])
+    else:
+      targets.append(object_name(objects + 1 + rnd.randint(0, objects)) + "_OBJ.tiff")   # not in the tree
+  return targets
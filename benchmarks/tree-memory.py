@@ -0,0 +1,142 @@
+# tree-memory.py
+##
+## Memory benchmark of the scanned tree: my_tree.FileTable against the parallel lists of filenames and
+## directories it replaced (big_file_list / big_path_list), for a synthetic tree shaped like ours (see
+## synthetic.py).  Nothing is written to disk, the (directory, filename) pairs are generated in memory.
+##
+##   lists_shared    - parallel lists, one directory string per directory shared by its files (as os.walk( ) gives)
+##   lists_per_file  - parallel lists, a directory string built for every file
+##   file_table      - FileTable: interned directory table and an array of directory ids
+##
+## Each is measured with tracemalloc, containers only: the filename strings are created beforehand and
+## shared by all three, so only what each structure adds is counted.
+##
+## python3 benchmarks/tree-memory.py --size small|medium|large --output <results JSON>
+
+import os
+import sys
+import gc
+import json
+import time
+import getopt
+import itertools
+import tracemalloc
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+# Local packages
+import my_tree
+import synthetic
+
+# Globals
+sizes = {'small': 20000, 'medium': 200000, 'large': 1000000}   # Files in the synthetic tree
+size = 'small'
+files = sizes[size]
+depth = 6
+fanout = 8
+per_dir = 24
+pdf_every = 10
+root = '/mnt/onedrive/Digital Collections/Grinnell College Libraries'   # Prefix of every directory, as long as ours
+output = False
+usage = "python3 benchmarks/tree-memory.py --help --size <small|medium|large> --files <files in the tree> --depth <directory levels> --fanout <directories per level> --per-dir <files per directory> --root <directory prefix> --output <results JSON>"
+
+
+# measured(build) - Call build( ), returning (its result, bytes it allocated and still holds)
+# ---------------------------------------------------------------------------------------
+def measured(build):
+  gc.collect( )
+  tracemalloc.start( )
+  before = tracemalloc.get_traced_memory( )[0]
+  result = build( )
+  held = tracemalloc.get_traced_memory( )[0] - before
+  tracemalloc.stop( )
+  return (result, held)
+
+
+# --- Main
+
+if __name__ == '__main__':
+
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], 'h', ["help", "size=", "files=", "depth=", "fanout=", "per-dir=", "root=", "output="])
+  except getopt.GetoptError as e:
+    print(f"{e}\n{usage}", file=sys.stderr)
+    sys.exit(2)
+
+  for opt, arg in opts:
+    if opt in ("-h", "--help"):
+      print(usage)
+      sys.exit( )
+    elif opt == "--size":
+      if arg not in sizes:
+        print(f"--size must be one of: {', '.join(sizes)}.", file=sys.stderr)
+        sys.exit(2)
+      size = arg
+      files = sizes[arg]
+    elif opt == "--root":
+      root = arg
+    elif opt == "--output":
+      output = arg
+    else:
+      try:
+        val = int(arg)
+      except ValueError:
+        val = -1
+      if val < 1:
+        print(f"{opt} must be an integer >= 1.", file=sys.stderr)
+        sys.exit(2)
+      if opt == "--files":
+        files = val
+        size = f"{val}-files"
+      elif opt == "--depth":
+        depth = val
+      elif opt == "--fanout":
+        fanout = val
+      else:
+        per_dir = val
+
+  # The tree as os.walk( ) would list it: each directory once, with its filenames
+  objects = synthetic.objects_for(files, pdf_every)
+  listing = [(os.path.join(root, dirname), [name for (d, name) in group])
+             for dirname, group in itertools.groupby(synthetic.tree_files(objects, pdf_every, per_dir, depth, fanout), key=lambda pair: pair[0])]
+  tree_files = sum(len(names) for (dirpath, names) in listing)
+  print(f"Synthetic tree of {tree_files} files in {len(listing)} directories:")
+
+  def lists_shared( ):
+    (big_file_list, big_path_list) = ([ ], [ ])
+    for dirpath, names in listing:
+      big_file_list.extend(names)
+      big_path_list.extend([dirpath] * len(names))
+    return (big_file_list, big_path_list)
+
+  def lists_per_file( ):
+    (big_file_list, big_path_list) = ([ ], [ ])
+    for dirpath, names in listing:
+      relative = os.path.relpath(dirpath, root)
+      for name in names:
+        big_file_list.append(name)
+        big_path_list.append(os.path.join(root, relative))   # a new string for every file
+    return (big_file_list, big_path_list)
+
+  def file_table( ):
+    table = my_tree.FileTable( )
+    for dirpath, names in listing:
+      table.add_dir(dirpath, names)
+    return table
+
+  cases = { }
+  for name, build in (('lists_shared', lists_shared), ('lists_per_file', lists_per_file), ('file_table', file_table)):
+    (result, held) = measured(build)
+    cases[name] = {'bytes': held, 'bytes_per_file': round(held / max(1, tree_files), 2)}
+    print(f"  {name:<15} {held / 1e6:9.1f} MB  {cases[name]['bytes_per_file']:7.2f} bytes/file")
+    del result
+
+  results = {'benchmark': 'tree-memory', 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split( )[0],
+             'settings': {'size': size, 'files': tree_files, 'directories': len(listing), 'depth': depth, 'fanout': fanout,
+                          'per_dir': per_dir, 'root': root},
+             'cases': cases}
+  if output:
+    with open(output, 'w') as f:
+      json.dump(results, f, indent=2)
+    print(f"\nResults saved in '{output}'.")
@@ -0,0 +1,491 @@
+# my_azure
+##
+## Azure Blob Storage uploads for the --copy-to-azure post-processing of `network-file-finder.py`.
+##
+## An Uploader copies the best match of every match-list row (and with --extended its _TN. and _JPG.
+## siblings) into the 'objs', 'thumbs' or 'smalls' container.  Rows are uploaded by a bounded pool of
+## threads sharing ONE BlobServiceClient, and so one HTTP connection pool; transient failures are
+## retried with exponential backoff.  Results come back in the original row order, so `object_urls.csv`
+## is the same no matter how many workers run.  A file wanted by several rows is sent once: later rows
+## wait for the upload under way and only try it again themselves if it fails.
+##
+## Before uploading, prefetch( ) lists the 'objs', 'thumbs' and 'smalls' containers once (filtered by
+## name prefix when only a few files are wanted) so "is it already there?" is a local lookup rather than
+## one exists( ) round trip per file.  Any object with get_blob_client(container, blob) returning something
+## with exists( ) and upload_blob(data), and get_container_client(container) returning something with
+## list_blobs(name_starts_with), can stand in for the service client.
+##
+## A Manifest remembers what this machine uploaded (blob, container, size, mtime and SHA-256).  It is
+## checked before any network call: a file unchanged since its upload is skipped with zero requests, a
+## changed one is overwritten.
+##
+## Files of `large_file_bytes` or more are sent as blocks: each file's blocks are read through mmap and
+## staged `block_workers` at a time, then committed as one block list.  A ByteBudget shared by every
+## upload caps the bytes held in memory for staging, however many files are in flight.
+##
+## With a my_matcher.SiblingMap of the scanned tree, --extended finds each target's _TN. and _JPG. files
+## by lookup, anywhere in the tree, rather than guessing their names and stat-ing them one by one.
+
+import os
+import json
+import time
+import random
+import hashlib
+import mmap
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import defaultdict, deque
+
+# Local packages
+import my_colorama
+
+azure_base_url = "https://dgobjects.blob.core.windows.net/"
+min_score = 90              # Best matches scoring below this are NOT uploaded
+retry_statuses = (408, 429, 500, 502, 503, 504)
+containers = ('objs', 'thumbs', 'smalls')
+small_candidates = 200      # Wanted files per container at or below which listings are filtered by prefix
+manifest_file = 'upload-manifest.json'   # Default local record of uploaded files
+block_size = 8 * 1024 * 1024             # Bytes per staged block of a large file
+large_file_bytes = 64 * 1024 * 1024      # Files this big or bigger are uploaded as blocks
+
+try:
+  from azure.core.exceptions import ServiceRequestError, ServiceResponseError, HttpResponseError
+except ImportError:
+  ServiceRequestError = ServiceResponseError = HttpResponseError = None
+
+
+# container_for(match) - The container ['objs','thumbs','smalls'] a file belongs in, and its blob URL
+# ---------------------------------------------------------------------------------------
+def container_for(match):
+  upper = match.upper( )   # sibling derivatives found in the tree may be spelled '_tn.' or '_jpg.'
+  if "_TN." in upper:
+    container_name = 'thumbs'
+  elif "_JPG." in upper:
+    container_name = 'smalls'
+  else:
+    container_name = 'objs'
+  return (container_name, f"{azure_base_url}{container_name}/{match}")
+
+
+# listing_prefixes(names) - Name prefixes covering `names` with a few filtered listings: names are grouped by
+# their leading collection prefix (e.g. 'grinnell_') and each group is listed by its longest common prefix
+# ---------------------------------------------------------------------------------------
+def listing_prefixes(names):
+  groups = defaultdict(list)
+  for name in names:
+    groups[name.split('_', 1)[0] + '_' if '_' in name else name].append(name)
+  return sorted(os.path.commonprefix(group) for group in groups.values( ))
+
+
+# file_sha256(path) - SHA-256 hex digest of a file's content, read a MB at a time
+# ---------------------------------------------------------------------------------------
+def file_sha256(path):
+  digest = hashlib.sha256( )
+  with open(path, 'rb') as f:
+    for block in iter(lambda: f.read(1024 * 1024), b''):
+      digest.update(block)
+  return digest.hexdigest( )
+
+
+# Manifest(filename, save_every) - Local, thread-safe record of every file uploaded to (or found in) storage
+#
+# Entries are keyed 'container/blob' and hold the blob, container, size, mtime and sha256 of the local file
+# at upload time.  Blobs found already in storage are recorded without a hash.  The manifest is saved
+# atomically every `save_every` new records and by save( ).
+# ---------------------------------------------------------------------------------------
+class Manifest:
+
+  def __init__(self, filename=manifest_file, save_every=100):
+    self.filename = filename
+    self.save_every = save_every
+    self.entries = { }
+    self.unsaved = 0
+    self.lock = threading.RLock( )
+    self.load( )
+
+  # load( ) - Read a saved manifest, an unreadable one is simply empty
+  def load(self):
+    try:
+      with open(self.filename, 'r') as j:
+        self.entries = json.load(j)['entries']
+    except (OSError, ValueError, KeyError, TypeError):
+      self.entries = { }
+
+  # save( ) - Write the manifest atomically
+  def save(self):
+    with self.lock:
+      tmp = f"{self.filename}.{os.getpid( )}.tmp"
+      with open(tmp, 'w') as j:
+        json.dump({'saved': time.time( ), 'entries': self.entries}, j)
+      os.replace(tmp, self.filename)
+      self.unsaved = 0
+
+  # check(container_name, blob, path, stat) - (state, sha256) where state is 'unchanged' if the local file is
+  # the one we uploaded, 'changed' if it differs, or None if this blob was never recorded.  sha256 is the
+  # file's digest when it had to be read to tell, so an upload of a changed file need not read it again.
+  def check(self, container_name, blob, path, stat):
+    with self.lock:
+      entry = self.entries.get(f"{container_name}/{blob}")
+    if entry is None:
+      return (None, None)
+    if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+      return ('unchanged', None)
+    if entry['size'] == stat.st_size and entry.get('sha256'):
+      sha256 = file_sha256(path)
+      if sha256 == entry['sha256']:
+        self.record(container_name, blob, stat, sha256)   # touched, not changed
+        return ('unchanged', sha256)
+      return ('changed', sha256)
+    return ('changed', None)
+
+  # record(container_name, blob, stat, sha256) - Remember one file as it is now in storage
+  def record(self, container_name, blob, stat, sha256=None):
+    with self.lock:
+      self.entries[f"{container_name}/{blob}"] = {'blob': blob, 'container': container_name, 'size': stat.st_size,
+                                                  'mtime': stat.st_mtime, 'sha256': sha256}
+      self.unsaved += 1
+      if self.unsaved >= self.save_every:
+        self.save( )
+
+
+# ByteBudget(limit) - Caps the bytes of block data held in memory across ALL concurrent uploads
+# ---------------------------------------------------------------------------------------
+class ByteBudget:
+
+  def __init__(self, limit):
+    self.limit = limit
+    self.used = 0
+    self.peak = 0
+    self.cond = threading.Condition( )
+
+  # acquire(n) - Wait until `n` more bytes fit (a single block bigger than the limit is let through alone)
+  def acquire(self, n):
+    with self.cond:
+      while self.used and self.used + n > self.limit:
+        self.cond.wait( )
+      self.used += n
+      self.peak = max(self.peak, self.used)
+
+  def release(self, n):
+    with self.cond:
+      self.used -= n
+      self.cond.notify_all( )
+
+
+# service_client(connect_str, workers) - A BlobServiceClient whose connection pool fits `workers` threads
+# ---------------------------------------------------------------------------------------
+def service_client(connect_str, workers=1):
+  from azure.storage.blob import BlobServiceClient
+  from azure.core.pipeline.transport import RequestsTransport
+  import requests
+
+  session = requests.Session( )
+  adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(10, workers))
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return BlobServiceClient.from_connection_string(connect_str, transport=RequestsTransport(session=session, session_owner=False))
+
+
+# transient(ex) - True for errors worth another try: connection trouble, throttling and server errors
+# ---------------------------------------------------------------------------------------
+def transient(ex):
+  if ServiceRequestError is None:
+    return isinstance(ex, (ConnectionError, TimeoutError))
+  if isinstance(ex, (ServiceRequestError, ServiceResponseError, ConnectionError, TimeoutError)):
+    return True
+  return isinstance(ex, HttpResponseError) and ex.status_code in retry_statuses
+
+
+# Uploader(service, workers, retries, backoff, manifest) - Concurrent, retrying uploads into Azure Blob Storage
+# ---------------------------------------------------------------------------------------
+class Uploader:
+
+  def __init__(self, service, workers=1, retries=3, backoff=1.0, manifest=None, block_size=block_size,
+               block_workers=4, max_buffer=256 * 1024 * 1024, siblings=None):
+    self.service = service
+    self.manifest = manifest
+    self.siblings = siblings
+    self.block_size = block_size
+    self.block_workers = block_workers
+    self.budget = ByteBudget(max_buffer)
+    self.workers = workers
+    self.retries = retries
+    self.backoff = backoff
+    self.counts = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'remote_calls': 0, 'bytes': 0}
+    self.listing = None   # container: {blob name: size} once prefetch( ) has run
+    self.inflight = { }   # (container, blob): Future of the upload under way, True once the blob is in storage
+    self.lock = threading.Lock( )
+
+  # count(what, n) - Thread-safe tally of uploaded, skipped and failed files, remote calls and bytes uploaded
+  def count(self, what, n=1):
+    with self.lock:
+      self.counts[what] += n
+
+  # candidates(csvlines, extended) - {container: set of blob names} copy_rows( ) may upload.  With a manifest,
+  # files it already knows are unchanged, and files that do not exist locally, are left out.
+  def candidates(self, csvlines, extended=False):
+    wanted = defaultdict(set)
+    for line in csvlines:
+      try:
+        score = int(line[3])
+      except (ValueError, IndexError):
+        continue
+      files = [(line[4], os.path.join(line[5], line[4]))] if score >= min_score else [ ]
+      if extended:
+        files += [found for found in self.extended_files(line[1], line[5], verify=False) if found]
+      for (name, file_path) in files:
+        container_name = container_for(name)[0]
+        if not self.settled(container_name, name, file_path):
+          wanted[container_name].add(name)
+    return wanted
+
+  # extended_files(target, path, verify) - The target's [_TN., _JPG.] files as (name, file path) pairs, None
+  # where there is no such file.  Without a SiblingMap the names are guessed from the target and, if
+  # `verify`, looked for in the best match's `path` with os.path.isfile( ).
+  def extended_files(self, target, path, verify=True):
+    files = [ ]
+    for (suffix, replacement) in (('_tn', "_TN.jpg"), ('_jpg', "_JPG.jpg")):
+      name = target.replace("_OBJ.", replacement)
+      if self.siblings is not None:
+        found = self.siblings.find(target, suffix, path, name)
+        files.append((found[0], os.path.join(found[1], found[0])) if found else None)
+      else:
+        file_path = os.path.join(path, name)
+        files.append((name, file_path) if not verify or os.path.isfile(file_path) else None)
+    return files
+
+  # settled(container_name, blob, path) - True if the manifest says `path` is already in storage as is,
+  # or there is no such local file to upload
+  def settled(self, container_name, blob, path):
+    if not self.manifest:
+      return False
+    try:
+      return self.manifest.check(container_name, blob, path, os.stat(path))[0] == 'unchanged'
+    except OSError:
+      return True
+
+  # prefetch(csvlines, extended) - List the containers once into {container: {name: size}} maps.  A container
+  # with at most `small_candidates` wanted files is listed by name prefix, otherwise in full.  With csvlines
+  # None (rows still to come, see --pipeline) all three containers are listed in full.
+  # If a listing fails every file falls back to its own exists( ) check.
+  def prefetch(self, csvlines, extended=False):
+    listing = { }
+    wanted = self.candidates(csvlines, extended) if csvlines is not None else {name: None for name in containers}
+    try:
+      for container_name, names in wanted.items( ):
+        if names is not None and not names:
+          continue
+        prefixes = listing_prefixes(names) if names and len(names) <= small_candidates else ['']
+        if '' in prefixes:
+          prefixes = ['']
+        container_client = self.service.get_container_client(container_name)
+        blobs = { }
+        for prefix in prefixes:
+          for page in container_client.list_blobs(name_starts_with=prefix or None).by_page( ):
+            self.count('remote_calls')
+            for blob in page:
+              blobs[blob.name] = blob.size
+        listing[container_name] = blobs
+    except Exception as ex:
+      my_colorama.yellow(f"Unable to list the Azure Storage containers, checking each file instead: {ex}")
+      return None
+    self.listing = listing
+    return listing
+
+  # exists(container_name, blob_client, match, size) - Is `match` already in storage?  Answered from the prefetch( )
+  # listing when there is one, otherwise by asking the service.  A listed blob whose size differs from the
+  # local `size` does not count.
+  def exists(self, container_name, blob_client, match, size=None):
+    if self.listing is not None and container_name in self.listing:
+      with self.lock:
+        listed = self.listing[container_name].get(match)
+      return listed is not None and (size is None or listed == size)
+    return self.with_retry(lambda: self.remote(blob_client.exists))
+
+  # enlist(container_name, match, size) - Enter a file just uploaded into the listing
+  def enlist(self, container_name, match, size):
+    if self.listing is not None and container_name in self.listing:
+      with self.lock:
+        self.listing[container_name][match] = size
+
+  # claim(key) - None once this thread is the one to check and upload `key` = (container, blob), else the Future
+  # of the same file's upload already under way for another row
+  def claim(self, key):
+    with self.lock:
+      running = self.inflight.get(key)
+      if running is None:
+        self.inflight[key] = Future( )
+      return running
+
+  # release(key, stored) - The upload of `key` is over, tell the rows waiting on it whether the file is now stored
+  def release(self, key, stored):
+    with self.lock:
+      running = self.inflight.pop(key)
+    running.set_result(stored)
+
+  # remote(call, *args) - call(*args), counted as one remote call
+  def remote(self, call, *args):
+    self.count('remote_calls')
+    return call(*args)
+
+  # with_retry(call) - call( ), retried up to `retries` times with exponential backoff on transient errors
+  def with_retry(self, call):
+    for attempt in range(self.retries + 1):
+      try:
+        return call( )
+      except Exception as ex:
+        if attempt >= self.retries or not transient(ex):
+          raise
+        time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random( )))
+
+  # upload(target, score, match, upload_file_path) - Upload one file unless its score is too low, the
+  # manifest says it is unchanged, or it already exists.  Returns the blob URL, or False if the file was
+  # not (and is not) in storage.
+  def upload(self, target, score, match, upload_file_path):
+    try:
+
+      # Check if the match score was 90 or above, if not, don't copy it!
+      if score < min_score:
+        my_colorama.red(f"Best match for '{target}' has an insufficient match score of {score}.  It will NOT be copied to Azure storage.")
+        return False
+
+      (container_name, url) = container_for(match)
+
+      # A file the manifest says is unchanged since we uploaded it costs no remote calls at all
+      stat = os.stat(upload_file_path) if self.manifest else None
+      (state, sha256) = self.manifest.check(container_name, match, upload_file_path, stat) if self.manifest else (None, None)
+      if state == 'unchanged':
+        my_colorama.yellow(f"'{match}' is unchanged since its upload to Azure Storage container '{container_name}'.  Skipping this upload.")
+        self.count('skipped')
+        return url
+
+      # The same file wanted by an earlier row may be on its way up right now.  Wait for that upload, and only
+      # if it fails try again here.
+      key = (container_name, match)
+      running = self.claim(key)
+      while running is not None:
+        if running.result( ):
+          my_colorama.yellow(f"Blob '{match}' is in Azure Storage container '{container_name}' for an earlier row.  Skipping this upload.")
+          self.count('skipped')
+          return url
+        running = self.claim(key)
+
+      stored = False
+      try:
+        # Create a blob client using the local file name as the name for the blob
+        blob_client = self.service.get_blob_client(container=container_name, blob=match)
+        if state != 'changed' and self.exists(container_name, blob_client, match, stat.st_size if stat else None):
+          my_colorama.yellow(f"Blob '{match}' already exists in Azure Storage container '{container_name}'.  Skipping this upload.")
+          if self.manifest:
+            self.manifest.record(container_name, match, stat)
+          self.count('skipped')
+        else:
+          if state == 'changed':
+            my_colorama.blue(f"'{match}' changed since its last upload, replacing it in Azure Storage container '{container_name}'")
+          else:
+            my_colorama.blue(f"Uploading '{match}' to Azure Storage container '{container_name}'")
+          if self.manifest and sha256 is None:
+            sha256 = file_sha256(upload_file_path)
+          size = self.upload_file(blob_client, upload_file_path)
+          self.enlist(container_name, match, size)
+          if self.manifest:
+            self.manifest.record(container_name, match, stat, sha256)
+          self.count('uploaded')
+        stored = True
+      finally:
+        self.release(key, stored)
+
+      return url
+
+    except Exception as ex:
+      my_colorama.yellow('Exception:')
+      my_colorama.yellow(f"{ex}")
+      self.count('failed')
+      return False
+
+  # upload_file(blob_client, upload_file_path) - Send one file, in one shot or as blocks if it is large, returning its size
+  def upload_file(self, blob_client, upload_file_path):
+    size = os.path.getsize(upload_file_path)
+    if size >= max(large_file_bytes, self.block_size):
+      self.upload_blocks(blob_client, upload_file_path, size)
+    else:
+      self.with_retry(lambda: self.remote(self.upload_whole, blob_client, upload_file_path))
+    self.count('bytes', size)
+    return size
+
+  # upload_whole(blob_client, upload_file_path) - Send one small file's bytes, re-opened on every attempt
+  def upload_whole(self, blob_client, upload_file_path):
+    with open(file=upload_file_path, mode="rb") as data:
+      blob_client.upload_blob(data, overwrite=True)
+
+  # upload_blocks(blob_client, upload_file_path, size) - Stage a large file block by block, `block_workers`
+  # blocks at a time and within the shared ByteBudget, then commit the block list.  Each block is retried
+  # on its own, so a failure late in a multi-gigabyte file does not resend the whole file.
+  def upload_blocks(self, blob_client, upload_file_path, size):
+    count = (size + self.block_size - 1) // self.block_size
+    block_ids = [f"{i:08d}" for i in range(count)]   # the SDK base64-encodes these, all the same length
+
+    with open(upload_file_path, 'rb') as f, mmap.mmap(f.fileno( ), 0, access=mmap.ACCESS_READ) as mapped:
+      def stage(i):
+        start = i * self.block_size
+        length = min(self.block_size, size - start)
+        self.budget.acquire(length)
+        try:
+          data = mapped[start:start + length]   # pages are read from disk only now, one block at a time
+          self.with_retry(lambda: self.remote(blob_client.stage_block, block_ids[i], data, length))
+        finally:
+          self.budget.release(length)
+
+      with ThreadPoolExecutor(max_workers=max(1, self.block_workers)) as pool:
+        futures = [pool.submit(stage, i) for i in range(count)]
+        try:
+          for future in futures:
+            future.result( )
+        except Exception:
+          for future in futures:
+            future.cancel( )   # a block failed for good, don't stage the rest
+          raise
+
+    self.with_retry(lambda: self.remote(blob_client.commit_block_list, block_ids))
+
+  # copy_row(line, extended) - Upload one match-list row's best match (and with `extended` its _TN. and
+  # _JPG. siblings), returning its [object, small, thumb] URL triple for object_urls.csv
+  def copy_row(self, line, extended=False):
+    target = line[1]
+    score = int(line[3])
+    match = line[4]
+    path = line[5]
+
+    # Build a network file path for the best match, do it and return an Azure Blob URL for the object
+    url = self.upload(target, score, match, os.path.join(path, match))
+    tn_url = False
+    jpg_url = False
+
+    # If --extended is on... try again for a _TN. file and _JPG. file
+    if extended:
+      (tn, jpg) = self.extended_files(target, path)
+      if tn:
+        tn_url = self.upload(tn[0], 100, tn[0], tn[1])
+      if jpg:
+        jpg_url = self.upload(jpg[0], 100, jpg[0], jpg[1])
+
+    # Build a set of 3 Azure URLs, some may be blank
+    return [url or "", jpg_url or "", tn_url or ""]
+
+  # copy_rows(csvlines, extended) - copy_row( ) for every row, `workers` rows at a time, yielding the URL
+  # triples in the original csvlines order.  `csvlines` may be any iterable, e.g. rows still being matched;
+  # at most 2 x `workers` rows are read ahead of the one being yielded.
+  def copy_rows(self, csvlines, extended=False):
+    if self.workers <= 1:
+      for line in csvlines:
+        yield self.copy_row(line, extended)
+      return
+
+    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+      pending = deque( )
+      for line in csvlines:
+        pending.append(pool.submit(self.copy_row, line, extended))
+        if len(pending) >= 2 * self.workers:
+          yield pending.popleft( ).result( )
+      while pending:
+        yield pending.popleft( ).result( )
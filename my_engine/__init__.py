@@ -0,0 +1,329 @@
+# my_engine
+##
+## The headless search shared by `network-file-finder.py`, `streamlit_app.py` and `batch-file-finder.py`.
+##
+## Reading the list of target filenames, turning worksheet rows into targets, and the batched
+## match / checkpoint / match-list.csv loop all live here, with NO console or UI output.  Each entry
+## point only decides how (or whether) to report the rows a Search yields.
+##
+## Jobs runs whole searches in background threads, each one a Job with an ID, progress, partial
+## results and a cancel flag, so a UI can submit a search and poll it instead of running it inline.
+
+import time
+import uuid
+import threading
+import collections
+import concurrent.futures
+
+# Local packages
+import my_matcher
+import my_results
+import my_metrics
+
+file_list_file = 'file-list.tmp'
+
+
+# read_file_list(filename) - The target filenames saved by a previous run, one per line
+# ---------------------------------------------------------------------------------------
+def read_file_list(filename=file_list_file):
+  with open(filename, 'r') as file_list:
+    return [line.strip( ) for line in file_list]
+
+
+# save_file_list(filenames, filename) - Keep the worksheet's filenames for a later --kept-file-list run
+# ---------------------------------------------------------------------------------------
+def save_file_list(filenames, filename=file_list_file):
+  with open(filename, 'w') as file_list:
+    for name in filenames:
+      file_list.write(f"{name}\n")
+
+
+# build_targets(filenames, skip_rows, grinnell) - Return (targets, skipped) where skipped lists the
+# (worksheet row, filename) header rows left out.  With `grinnell`, a 'grinnell_' target that does not
+# contain '_OBJ' gets '_OBJ.' appended.
+# ---------------------------------------------------------------------------------------
+def build_targets(filenames, skip_rows=1, grinnell=False):
+  targets = [ ]
+  skipped = [ ]
+  for x, target in enumerate(filenames):
+    if x < skip_rows:
+      skipped.append((x, target))
+      continue
+    if grinnell and ('grinnell_' in target) and ('_OBJ' not in target):
+      target += '_OBJ.'
+    targets.append(target)
+  return (targets, skipped)
+
+
+# result_line(counter, target, significant_text, matches, method, tree) - One 13 column match-list.csv row
+# ---------------------------------------------------------------------------------------
+def result_line(counter, target, significant_text, matches, method, tree):
+  csv_line = [f"{counter}", target, significant_text or "None"]
+  if matches:
+    for (match, score, index) in matches:
+      csv_line.extend([f"{score}", match, tree.dir(index)])
+  else:
+    csv_line.extend(['0', 'NO match', 'NO match'])
+
+  # Flag which path, 'stem' hash or 'fuzzy' scoring, produced the match in the last column
+  csv_line.extend([''] * (12 - len(csv_line)))
+  csv_line.append(method)
+  return csv_line
+
+
+# Progress(total) - Rows done, rows/sec and ETA of a search
+#
+# The search's thread counts rows with step( ), a UI reads the rest whenever it refreshes.
+# ---------------------------------------------------------------------------------------
+class Progress:
+
+  def __init__(self, total):
+    self.total = total
+    self.done = 0
+    self.started = time.time( )
+
+  # step(rows) - Count finished rows
+  def step(self, rows=1):
+    self.done += rows
+
+  def fraction(self):
+    return min(1.0, self.done / self.total) if self.total else 1.0
+
+  def rate(self):
+    elapsed = time.time( ) - self.started
+    return self.done / elapsed if elapsed > 0 else 0.0
+
+  # eta( ) - Seconds until the last row at the current rate, or None before there is a rate
+  def eta(self):
+    rate = self.rate( )
+    return (self.total - self.done) / rate if rate > 0 else None
+
+  # text( ) - e.g. '1200 of 5000 rows, 240.3 rows/s, ETA 0:15'
+  def text(self):
+    eta = self.eta( )
+    eta = f"{int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else '?'
+    return f"{self.done} of {self.total} rows, {self.rate( ):.1f} rows/s, ETA {eta}"
+
+
+# Row - One finished target as yielded by Search.rows( )
+# ---------------------------------------------------------------------------------------
+class Row:
+  __slots__ = ('counter', 'target', 'csv_line', 'significant_text', 'matches', 'resumed')
+
+  def __init__(self, counter, target, csv_line, significant_text=False, matches=None, resumed=False):
+    self.counter = counter
+    self.target = target
+    self.csv_line = csv_line
+    self.significant_text = significant_text
+    self.matches = matches
+    self.resumed = resumed   # True for a row re-used from an interrupted search, matches is then None
+
+
+# Search(tree, targets, ...) - Match every target against one scanned tree
+#
+# Builds the engine, match cache, Matcher and Checkpoint for the search.  rows( ) then matches the targets
+# `checkpoint_rows` at a time and yields a Row for each, in order, streaming each into match-list.csv
+# (when `output_to_csv`) and the checkpoint as it goes.  Given a `cancelled` threading.Event, rows( ) stops
+# before the next batch once it is set.  The time spent building the indexes, matching and
+# writing, and the matcher's and cache's counts, go into `metrics` (a my_metrics.Metrics).
+# ---------------------------------------------------------------------------------------
+class Search:
+
+  def __init__(self, tree, targets, significant=False, engine_name='auto', shortlist_size=0, min_shortlist=50,
+               match_workers=1, match_cache_size=100000, resume=False, grinnell=False, skip_rows=1,
+               checkpoint_rows=250, output_to_csv=False, metrics=None):
+    self.tree = tree
+    self.metrics = metrics or my_metrics.Metrics( )
+    self.targets = targets
+    self.checkpoint_rows = checkpoint_rows
+    self.output_to_csv = output_to_csv
+    self.engine = my_matcher.get_engine(engine_name)
+
+    # Results of earlier runs against this same tree snapshot are re-used from the match cache
+    snapshot = tree.snapshot_id( )
+    self.cache = None
+    if match_cache_size:
+      with self.metrics.stage('cache_load'):
+        self.cache = my_matcher.MatchCache(snapshot, significant, my_matcher.scorer_id(shortlist_size, min_shortlist), match_cache_size)
+
+    # Build the stem, --regex and trigram indexes once for the whole tree
+    with self.metrics.stage('index'):
+      self.matcher = my_matcher.Matcher(tree.names, self.engine, significant, shortlist_size, min_shortlist, match_workers, self.cache)
+
+    # Every finished row is checkpointed.  With `resume`, rows an interrupted run already finished are re-used.
+    meta = {'snapshot': snapshot, 'regex': significant, 'engine': self.engine.name, 'grinnell': grinnell,
+            'skip_rows': skip_rows, 'shortlist': [shortlist_size, min_shortlist]}
+    self.checkpoint = my_results.Checkpoint(meta)
+    self.done = self.checkpoint.resume(targets) if resume else { }
+    self.started = None
+    self.finished = None
+
+  # rows(cancelled) - Match the targets a batch at a time, yielding a Row for every target in order, until
+  # `cancelled` (a threading.Event) is set.  A search stopped early leaves its checkpoint behind.
+  def rows(self, cancelled=None):
+    self.started = time.time( )
+    metrics = self.metrics
+    self.checkpoint.start(self.done)
+    match_list = my_results.MatchListWriter( ) if self.output_to_csv else None
+    done = self.done
+    counter = 0
+
+    try:
+      for start in range(0, len(self.targets), self.checkpoint_rows):
+        if cancelled is not None and cancelled.is_set( ):
+          return
+        batch = self.targets[start:start + self.checkpoint_rows]
+        with metrics.stage('match'):
+          results = iter(self.matcher.match([target for n, target in enumerate(batch, counter + 1) if n not in done]))
+
+        for target in batch:
+          counter += 1
+
+          # A row finished by an interrupted run needs no matching at all
+          if counter in done:
+            row = Row(counter, target, done[counter], resumed=True)
+          else:
+            (significant_text, matches, method) = next(results)
+            csv_line = result_line(counter, target, significant_text, matches, method, self.tree)
+            with metrics.stage('checkpoint'):
+              self.checkpoint.add(csv_line)
+            row = Row(counter, target, csv_line, significant_text, matches)
+
+          if match_list:
+            with metrics.stage('csv'):
+              match_list.write(row.csv_line)
+          yield row
+
+    finally:
+      if match_list:
+        match_list.close( )
+      self.matcher.close( )
+      self.record( )
+
+    self.checkpoint.finish( )
+    self.finished = time.time( )
+
+  # record( ) - Put the matcher's and match cache's counts into the metrics
+  def record(self):
+    matcher = self.matcher
+    metrics = self.metrics
+    metrics.set('targets', len(self.targets))
+    metrics.set('rows_resumed', len(self.done))
+    metrics.set('stem_hits', matcher.stem_hits)
+    metrics.set('fuzzy_matched', matcher.fuzzy_matched)
+    metrics.set('full_scans', matcher.full_scans)
+    metrics.set('candidates_scored', matcher.candidates_scored)
+    metrics.set('fuzzy_scored', matcher.fuzzy_scored)
+    metrics.set('candidates_per_fuzzy_target', round(matcher.candidates_scored / matcher.fuzzy_scored, 1) if matcher.fuzzy_scored else 0)
+    metrics.set('max_candidates_per_target', matcher.max_candidates)
+    if self.cache:
+      metrics.set('match_cache_hits', self.cache.hits)
+      metrics.set('match_cache_misses', self.cache.misses)
+
+  # save_cache( ) - Keep this search's match results for the next one, returns an error message or None
+  def save_cache(self):
+    if self.cache:
+      try:
+        with self.metrics.stage('cache_save'):
+          self.cache.save( )
+      except OSError as e:
+        return f"Unable to save the match cache: {e}"
+    return None
+
+  # rate( ) - Rows per second matched (or re-used) by rows( )
+  def rate(self):
+    if self.started is None:
+      return 0.0
+    elapsed = (self.finished or time.time( )) - self.started
+    return len(self.targets) / elapsed if elapsed > 0 else 0.0
+
+  # summary( ) - Plain text lines describing how the targets were matched
+  def summary(self):
+    matcher = self.matcher
+    lines = [f"{matcher.stem_hits} targets matched by filename stem, {matcher.fuzzy_matched} by fuzzy matching ({matcher.full_scans} full scans)."]
+    if self.done:
+      lines.append(f"{len(self.done)} rows re-used from an interrupted search.")
+    if self.cache:
+      lines.append(f"Match cache: {self.cache.hits} hits, {self.cache.misses} misses, {len(self.cache.entries)} results kept.")
+    return lines
+
+
+# Job(job_id) - One background search: its state, progress, messages and the rows found so far
+#
+# The job function reports through note( ) and hands its Search to follow( ), which collects the rows and
+# stops after the batch under way once cancel( ) is called.  A cancelled search leaves its checkpoint behind, so it can be resumed.
+# ---------------------------------------------------------------------------------------
+class Job:
+
+  def __init__(self, job_id):
+    self.id = job_id
+    self.state = 'queued'   # then 'running', and finally 'done', 'cancelled' or 'failed'
+    self.rows = [ ]
+    self.messages = [ ]     # (kind, text) pairs, kind is e.g. 'info' or 'warning'
+    self.progress = None
+    self.metrics = my_metrics.Metrics( )
+    self.error = None
+    self.settings = None    # what the job was submitted with, kept by the UI for work done after it finishes
+    self.cancelled = threading.Event( )
+    self.submitted = time.time( )
+    self.finished = None
+
+  # note(kind, text) - Record a message for the UI
+  def note(self, kind, text):
+    self.messages.append((kind, text))
+
+  def cancel(self):
+    self.cancelled.set( )
+
+  # follow(search) - Run the search, keeping every row it yields, until it ends or the job is cancelled
+  def follow(self, search):
+    self.progress = Progress(len(search.targets))
+    rows = search.rows(self.cancelled)
+    try:
+      for row in rows:
+        self.rows.append(row.csv_line)
+        self.progress.step( )
+    finally:
+      rows.close( )
+
+
+# Jobs(workers, keep) - Background executor for search jobs, and a table of them by job ID
+#
+# With the default single worker, searches run one at a time (they share match-list.csv and the checkpoint)
+# and later ones wait as 'queued'.  The `keep` most recent finished jobs are kept for their results.
+# ---------------------------------------------------------------------------------------
+class Jobs:
+
+  def __init__(self, workers=1, keep=20):
+    self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='search-job')
+    self.keep = keep
+    self.jobs = collections.OrderedDict( )
+    self.lock = threading.Lock( )
+
+  # submit(fn, *args) - Start fn(job, *args) in the background, returns its Job
+  def submit(self, fn, *args):
+    job = Job(uuid.uuid4( ).hex[:12])
+    with self.lock:
+      self.jobs[job.id] = job
+      finished = [k for k, j in self.jobs.items( ) if j.finished]
+      for k in finished[:max(0, len(finished) - self.keep)]:
+        del self.jobs[k]
+    self.executor.submit(self.run, job, fn, args)
+    return job
+
+  def run(self, job, fn, args):
+    job.state = 'running'
+    try:
+      if not job.cancelled.is_set( ):
+        fn(job, *args)
+      job.state = 'cancelled' if job.cancelled.is_set( ) else 'done'
+    except BaseException as e:
+      job.error = e
+      job.state = 'failed'
+    job.metrics.finish( )
+    job.finished = time.time( )
+
+  # get(job_id) - The Job, or None if unknown or forgotten
+  def get(self, job_id):
+    with self.lock:
+      return self.jobs.get(job_id)
@@ -0,0 +1,583 @@
+# my_matcher
+##
+## Pluggable fuzzy matching engines shared by `network-file-finder.py` and `streamlit_app.py`.
+##
+## Every engine scores a whole list of targets against a list of choices (filenames) and returns,
+## for each target, the top matches as (match, score, index) tuples just like fuzzywuzzy's
+## process.extract( ) does with an indexed dict of choices.  Blank targets return False.
+##
+##   fuzzywuzzy - the original pure-Python process.extract( ) loop, one target at a time
+##   rapidfuzz  - compiled WRatio bounds for a block of targets against ALL choices in one
+##                rapidfuzz.process.cdist( ) call, then exact fuzzywuzzy scores for the few
+##                files that can make the top three
+##
+## Both engines produce the same scores and the same order, so match-list.csv does not change.
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from fuzzywuzzy import fuzz as fw_fuzz, process, utils
+
+try:
+  import numpy as np
+  from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+  np = None
+  rf_process = None
+
+max_cells = 16 * 1024 * 1024   # Largest (targets x choices) score block scored at once, ~64MB of float32
+derivative_suffixes = ('_obj', '_tn', '_jpg')
+match_cache_file = os.path.join('.match-cache', 'matches.json')   # Default persistent match-result cache
+
+
+# full_process(s) - The exact processing process.extract( ) applies to queries and choices before WRatio
+# ---------------------------------------------------------------------------------------
+def full_process(s):
+  return utils.full_process(utils.full_process(s), force_ascii=True)
+
+
+# FuzzywuzzyEngine( ) - The original process.extract( ) matching, one target at a time
+# ---------------------------------------------------------------------------------------
+class FuzzywuzzyEngine:
+  name = 'fuzzywuzzy'
+
+  def __init__(self, workers=1):
+    self.workers = workers   # unused, the pure-Python scorer is single threaded
+
+  # extract(query, choices, limit) - Top `limit` matches of one query
+  def extract(self, query, choices, limit=3):
+    if not query:
+      return False
+    # Per https://github.com/seatgeek/fuzzywuzzy/issues/165 use an indexed dict of choices
+    return process.extract(query, {idx: el for idx, el in enumerate(choices)}, limit=limit)
+
+  # extract_batch(queries, choices, limit) - Top `limit` matches of every query
+  def extract_batch(self, queries, choices, limit=3):
+    choice_dict = {idx: el for idx, el in enumerate(choices)}
+    return [process.extract(q, choice_dict, limit=limit) if q else False for q in queries]
+
+  # extract_subset(query, choices, subset, limit) - Top `limit` matches of one query among choices[j] for j in `subset`
+  def extract_subset(self, query, choices, subset, limit=3):
+    if not query:
+      return False
+    return process.extract(query, {j: choices[j] for j in subset}, limit=limit)
+
+
+# RapidfuzzEngine( ) - Batched, compiled scoring of many targets at once
+#
+# rapidfuzz's WRatio is never more than 1 point below fuzzywuzzy's (fuzzywuzzy rounds each
+# intermediate ratio and its partial_ratio only tries a subset of alignments), so one cdist( )
+# call gives an upper bound for every (target, file) pair.  Only files whose bound can still reach
+# the top `limit` are re-scored with fuzzywuzzy's own WRatio, which keeps scores and tie order
+# identical to process.extract( ) while skipping the pure-Python scan of every other file.
+# ---------------------------------------------------------------------------------------
+class RapidfuzzEngine:
+  name = 'rapidfuzz'
+  first_look = 16   # Number of best-bound files re-scored before the remaining bounds are checked
+
+  def __init__(self, workers=-1):
+    if rf_process is None:
+      raise ImportError("The 'rapidfuzz' engine needs the rapidfuzz and numpy packages.")
+    self.workers = workers   # threads used by cdist( ), -1 = all cores
+    self.processed = (None, None)
+
+  # prepare(choices) - Run full_process( ) over the choices once and remember the result.  Only the
+  # full list is ever prepared, subsets are scored by index into it (see extract_subset( )).
+  def prepare(self, choices):
+    if self.processed[0] is not choices:
+      self.processed = (choices, [full_process(c) for c in choices])
+    return self.processed[1]
+
+  # extract(query, choices, limit) - Top `limit` matches of one query
+  def extract(self, query, choices, limit=3):
+    return self.extract_batch([query], choices, limit)[0]
+
+  # extract_batch(queries, choices, limit) - Top `limit` matches of every query
+  def extract_batch(self, queries, choices, limit=3):
+    results = [False] * len(queries)
+    rows = [i for i, q in enumerate(queries) if q]
+    if not rows:
+      return results
+
+    processed = self.prepare(choices)
+    block = max(1, max_cells // max(1, len(choices)))
+
+    for start in range(0, len(rows), block):
+      chunk = rows[start:start + block]
+      chunk_queries = [full_process(queries[i]) for i in chunk]
+      bounds = rf_process.cdist(chunk_queries, processed, scorer=rf_fuzz.WRatio, dtype=np.float32, workers=self.workers)
+      for row, i, query in zip(bounds, chunk, chunk_queries):
+        results[i] = [(choices[j], score, j) for (score, j) in self.verify(query, processed, row, limit)]
+
+    return results
+
+  # extract_subset(query, choices, subset, limit) - Top `limit` matches of one query among choices[j] for j in `subset`
+  def extract_subset(self, query, choices, subset, limit=3):
+    if not query:
+      return False
+    processed = self.prepare(choices)
+    candidates = [processed[j] for j in subset]
+    query = full_process(query)
+    bounds = rf_process.cdist([query], candidates, scorer=rf_fuzz.WRatio, dtype=np.float32, workers=self.workers)[0]
+    return [(choices[subset[k]], score, subset[k]) for (score, k) in self.verify(query, candidates, bounds, limit)]
+
+  # verify(query, processed, bounds, limit) - Exact fuzzywuzzy scores for the files that can make the top `limit`
+  def verify(self, query, processed, bounds, limit):
+    if not query:
+      return [(0, j) for j in range(min(limit, len(processed)))]   # fuzzywuzzy scores everything 0
+
+    exact = { }
+    def score(indices):
+      for j in indices:
+        if j not in exact:
+          exact[j] = fw_fuzz.WRatio(query, processed[j], full_process=False)
+      return sorted(exact.items( ), key=lambda item: (-item[1], item[0]))[:limit]
+
+    best = score(top_indices(bounds, max(limit, self.first_look)))
+    if len(best) == limit:
+      floor, last = best[-1][1], best[-1][0]
+      # Files that could beat the floor, or tie it with a lower index, still need an exact score
+      could_place = (bounds > floor) | ((bounds > floor - 1) & (np.arange(len(bounds)) < last))
+      best = score(np.flatnonzero(could_place).tolist( ))
+
+    return [(s, j) for (j, s) in best]
+
+
+# top_indices(row, limit) - Indices of the `limit` highest values, ties broken by lowest index
+# ---------------------------------------------------------------------------------------
+def top_indices(row, limit):
+  n = len(row)
+  if n > limit:
+    threshold = np.partition(row, n - limit)[n - limit]
+    candidates = np.flatnonzero(row >= threshold)
+  else:
+    candidates = np.arange(n)
+  order = np.argsort(-row[candidates], kind='stable')
+  return candidates[order][:limit].tolist( )
+
+
+# normalize_stem(name) - Lower-cased filename without its extension and any _OBJ/_TN/_JPG suffix
+# e.g. 'grinnell_3601', 'grinnell_3601_OBJ.' and 'Grinnell_3601_OBJ.tiff' all become 'grinnell_3601'
+# ---------------------------------------------------------------------------------------
+def normalize_stem(name):
+  (stem, suffix) = split_derivative(name)
+  return stem
+
+
+# split_derivative(name) - Return (normalized stem, derivative suffix) where suffix is '_obj', '_tn', '_jpg' or ''
+# ---------------------------------------------------------------------------------------
+def split_derivative(name):
+  stem = os.path.splitext(name.strip( ).lower( ))[0]
+  for suffix in derivative_suffixes:
+    if stem.endswith(suffix):
+      return (stem[:-len(suffix)], suffix)
+  return (stem, '')
+
+
+# StemIndex(choices) - Hash index from normalized stem to file indices, built once per tree
+#
+# A target whose normalized stem names a file outright is reported with a score of 100 and
+# never goes through fuzzy scoring.  Among several hits the file whose name IS the target
+# comes first, then the target's own derivative (_OBJ when the target has none), then the rest.
+# ---------------------------------------------------------------------------------------
+class StemIndex:
+
+  def __init__(self, choices):
+    self.choices = choices
+    self.stems = { }
+    for idx, choice in enumerate(choices):
+      self.stems.setdefault(normalize_stem(choice), [ ]).append(idx)
+
+  # lookup(target, limit) - Up to `limit` (match, 100, index) hits, or None if the stem is unknown
+  def lookup(self, target, limit=3):
+    (stem, suffix) = split_derivative(target)
+    hits = self.stems.get(stem) if stem else None
+    if not hits:
+      return None
+
+    wanted = suffix or '_obj'
+    name = target.strip( ).lower( )
+    def rank(j):
+      if self.choices[j].lower( ) == name:
+        return 0
+      return 1 if split_derivative(self.choices[j])[1] == wanted else 2
+
+    return [(self.choices[j], 100, j) for j in sorted(hits, key=rank)[:limit]]
+
+
+# SiblingMap(table) - Normalized stem to its _OBJ/_TN/_JPG derivative files anywhere in a scanned FileTable
+#
+# Lets --extended find a target's thumbnail and small image with a dictionary lookup instead of an
+# os.path.isfile( ) call (a remote stat on our network mounts) for every guessed name.
+# ---------------------------------------------------------------------------------------
+class SiblingMap:
+
+  def __init__(self, table):
+    self.table = table
+    self.stems = { }   # stem: {suffix: [file indices]}
+    for idx, name in enumerate(table.names):
+      (stem, suffix) = split_derivative(name)
+      if suffix:
+        self.stems.setdefault(stem, { }).setdefault(suffix, [ ]).append(idx)
+
+  # find(target, suffix, near, name) - (filename, dirpath) of the target's `suffix` derivative, or None.
+  # The file called `name` in directory `near` wins, then any such derivative in `near`, then the first one
+  # found anywhere in the tree.
+  def find(self, target, suffix, near=None, name=None):
+    hits = self.stems.get(split_derivative(target)[0], { }).get(suffix)
+    if not hits:
+      return None
+    table = self.table
+    nearby = [j for j in hits if table.dir(j) == near]
+    exact = [j for j in nearby if table.names[j] == name]
+    j = (exact or nearby or hits)[0]
+    return (table.names[j], table.dir(j))
+
+
+# SignificantIndex(regex, choices) - The --regex compiled once, with file indices grouped by what it captures
+#
+# A target's significant string (e.g. '3601' in 'grinnell_3601' for --regex '\d{4}') then picks its
+# candidate files with one dictionary lookup instead of a re.search( ) over every file.  Every match in a
+# filename is indexed, wherever it starts (so '3601' is found in 'x_2024_grinnell_3601.jpg' and in
+# 'x_136012.jpg'), which for fixed-width patterns like '\d{4}' gives exactly the files a re.search( ) of
+# the significant string would.  A significant string that no filename yields is still searched for across
+# the files, once, and remembered.
+# ---------------------------------------------------------------------------------------
+class SignificantIndex:
+
+  def __init__(self, regex, choices):
+    if '(' in regex:             # regex already has a (group), do not add one
+      self.pattern = re.compile(regex)
+    else:
+      self.pattern = re.compile(f"({regex})")   # regex is raw, add a (group) pair of parenthesis
+    self.choices = choices
+    self.groups = { }
+    self.scans = { }
+    for idx, choice in enumerate(choices):
+      match = self.pattern.search(choice)
+      while match:
+        group = self.groups.setdefault(match.group( ), [ ])
+        if not group or group[-1] != idx:   # a file is listed once per significant string
+          group.append(idx)
+        match = self.pattern.search(choice, match.start( ) + 1)
+
+  # significant(target) - The target's significant string, or False
+  def significant(self, target):
+    match = self.pattern.search(target)
+    return match.group( ) if match else False
+
+  # subset(target) - Indices of the target's significant files, or None if the target has no significant string
+  def subset(self, target):
+    value = self.significant(target)
+    if not value:
+      return None
+    if value in self.groups:
+      return self.groups[value]
+    if value not in self.scans:
+      try:
+        pattern = re.compile(value)
+      except re.error:
+        pattern = re.compile(re.escape(value))
+      self.scans[value] = [i for i, f in enumerate(self.choices) if pattern.search(f)]
+    return self.scans[value]
+
+
+# NgramIndex(choices, n) - Character n-gram inverted index over the (processed) choices
+#
+# Used to pull a shortlist of files that share the most n-grams with a target so that only the
+# shortlist is sent to the scorer.  This trades a little recall for speed: a file sharing NO n-grams
+# with its target can still get a (low) WRatio score, so when a target's shortlist is too small the
+# target falls back to a full scan.
+# ---------------------------------------------------------------------------------------
+class NgramIndex:
+
+  def __init__(self, choices, n=3):
+    if np is None:
+      raise ImportError("The n-gram shortlist needs the numpy package.")
+    self.n = n
+    self.size = len(choices)
+    postings = { }
+    for idx, choice in enumerate(choices):
+      for gram in self.grams(full_process(choice)):
+        postings.setdefault(gram, [ ]).append(idx)
+    self.postings = {gram: np.array(indices, dtype=np.int32) for gram, indices in postings.items( )}
+
+  # grams(text) - The set of distinct n-grams in `text`
+  def grams(self, text):
+    if len(text) <= self.n:
+      return {text} if text else set( )
+    return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+  # shortlist(query, size, minimum) - Up to `size` file indices sharing the most n-grams with `query`,
+  # in index order, or None (full scan) if fewer than `minimum` files share any n-gram at all
+  def shortlist(self, query, size, minimum):
+    counts = np.zeros(self.size, dtype=np.int32)
+    for gram in self.grams(full_process(query)):
+      if gram in self.postings:
+        counts[self.postings[gram]] += 1
+    candidates = np.flatnonzero(counts)
+    if len(candidates) < minimum:
+      return None
+    if len(candidates) > size:
+      candidates = np.sort(candidates[np.argsort(-counts[candidates], kind='stable')[:size]])
+    return candidates.tolist( )
+
+
+# shortlist_subsets(index, targets, subsets, size, minimum) - Give every target that has no --regex
+# subset an n-gram shortlist instead of ALL files (targets that fall back keep None)
+# ---------------------------------------------------------------------------------------
+def shortlist_subsets(index, targets, subsets, size=2000, minimum=50):
+  return [index.shortlist(target, size, minimum) if subset is None and target else subset
+          for target, subset in zip(targets, subsets)]
+
+
+engines = {'fuzzywuzzy': FuzzywuzzyEngine, 'rapidfuzz': RapidfuzzEngine}
+
+
+# get_engine(name, workers) - Return a matching engine by name, 'auto' picks the fastest available
+# ---------------------------------------------------------------------------------------
+def get_engine(name='auto', workers=-1):
+  if not name or name == 'auto':
+    name = 'rapidfuzz' if rf_process is not None else 'fuzzywuzzy'
+  if name not in engines:
+    raise ValueError(f"Unknown matching engine '{name}', choose one of: auto, {', '.join(engines)}")
+  return engines[name](workers)
+
+
+# match_targets(engine, targets, choices, subsets, limit) - Top matches for every target
+# `subsets`, when given, is aligned with `targets`: None means "score against ALL choices", otherwise
+# a list of indices into `choices` to restrict that target to.  Targets without a subset are scored
+# together in one batch.  Returned indices always refer to `choices`.
+# ---------------------------------------------------------------------------------------
+def match_targets(engine, targets, choices, subsets=None, limit=3):
+  if subsets is None:
+    subsets = [None] * len(targets)
+
+  results = [False] * len(targets)
+  full_scan = [i for i, subset in enumerate(subsets) if subset is None]
+  for i, matches in zip(full_scan, engine.extract_batch([targets[i] for i in full_scan], choices, limit)):
+    results[i] = matches
+
+  for i, subset in enumerate(subsets):
+    if subset is not None and targets[i]:
+      if subset:
+        results[i] = engine.extract_subset(targets[i], choices, subset, limit)
+      else:
+        results[i] = [ ]   # no significant files at all, that's NO match
+
+  return results
+
+
+# Process-pool matching.  The engine (with its already processed choices) and the file list are sent to
+# each worker process ONCE, through the pool initializer, and each task then carries only a chunk of targets
+# (and their subsets).  Workers are started with 'forkserver' where the platform has it, otherwise with the
+# platform's default: a bare fork( ) is never safe here, the searching process may be running other threads
+# (Streamlit search jobs, the Azure uploader, a background tree walk).
+# ---------------------------------------------------------------------------------------
+worker_state = { }
+
+def start_method( ):
+  return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods( ) else None
+
+def init_worker(engine, choices):
+  engine.workers = 1   # one process per core already, don't let cdist( ) spawn threads too
+  worker_state['engine'] = engine
+  worker_state['choices'] = choices
+
+def match_chunk(chunk):
+  (targets, subsets) = chunk
+  return match_targets(worker_state['engine'], targets, worker_state['choices'], subsets)
+
+
+# MatchPool(engine, choices, workers) - match_targets( ) farmed out to `workers` processes.  The pool is started
+# by the first batch big enough to need it and then re-used for every later batch until close( ); each batch
+# is split into one chunk per worker, and the results come back in the original order.
+# ---------------------------------------------------------------------------------------
+class MatchPool:
+  min_targets = 64   # Smaller batches are matched right here, in this process
+
+  def __init__(self, engine, choices, workers=1):
+    self.engine = engine
+    self.choices = choices
+    self.workers = workers
+    self.pool = None
+
+  # match(targets, subsets) - Top matches for every target, like match_targets( )
+  def match(self, targets, subsets=None):
+    if self.workers <= 1 or len(targets) < self.min_targets:
+      return match_targets(self.engine, targets, self.choices, subsets)
+
+    if subsets is None:
+      subsets = [None] * len(targets)
+    if self.pool is None:
+      if hasattr(self.engine, 'prepare'):
+        self.engine.prepare(self.choices)   # process the choices once, here, rather than once per worker
+      context = multiprocessing.get_context(start_method( ))
+      self.pool = context.Pool(self.workers, initializer=init_worker, initargs=(self.engine, self.choices))
+
+    chunk_size = math.ceil(len(targets) / self.workers)
+    chunks = [(targets[i:i + chunk_size], subsets[i:i + chunk_size]) for i in range(0, len(targets), chunk_size)]
+    results = [ ]
+    for matches in self.pool.imap(match_chunk, chunks):   # imap( ) keeps the chunks in order
+      results.extend(matches)
+    return results
+
+  # close( ) - Stop the worker processes, if any were started
+  def close(self):
+    if self.pool is not None:
+      self.pool.close( )
+      self.pool.join( )
+      self.pool = None
+
+
+# Matcher(choices, engine, significant, shortlist_size, min_shortlist, workers, cache) - Everything needed to
+# match targets against one tree: the stem fast path, --regex subsets, trigram shortlists and the engine.
+# The indexes are built once, match( ) may then be called for any number of batches of targets, all of them
+# sharing one MatchPool of `workers` processes until close( ).  With a MatchCache, targets answered by an
+# earlier run against the same tree are not matched again.
+# ---------------------------------------------------------------------------------------
+class Matcher:
+
+  def __init__(self, choices, engine, significant=False, shortlist_size=0, min_shortlist=50, workers=1, cache=None):
+    self.choices = choices
+    self.engine = engine
+    self.shortlist_size = shortlist_size
+    self.min_shortlist = min_shortlist
+    self.workers = workers
+    self.cache = cache
+    self.stem_index = StemIndex(choices)
+    self.significant_index = SignificantIndex(significant, choices) if significant else None
+    self.ngram_index = NgramIndex(choices) if shortlist_size else None
+    self.pool = MatchPool(engine, choices, workers)
+    self.stem_hits = 0
+    self.fuzzy_matched = 0
+    self.full_scans = 0
+    self.fuzzy_scored = 0        # fuzzy matched targets that were scored at all, i.e. not blank
+    self.candidates_scored = 0   # files scored for all fuzzy matched targets together
+    self.max_candidates = 0      # most files scored for any one target
+
+  # match(targets) - Return a (significant_text, matches, method) tuple for every target where
+  # method is 'stem', 'fuzzy' or 'none' and matches is False for a blank target
+  def match(self, targets):
+    if self.cache is None:
+      return self.match_all(targets)
+
+    results = [self.cache.get(target) if target else None for target in targets]
+    todo = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(todo, self.match_all([targets[i] for i in todo])):
+      results[i] = result
+      if targets[i]:
+        self.cache.put(targets[i], result)
+    return results
+
+  # match_all(targets) - match( ) without the cache
+  def match_all(self, targets):
+    # Settle exact and normalized-stem hits right away, only the misses need fuzzy matching...
+    all_matches = [self.stem_index.lookup(target) if target else None for target in targets]
+    methods = ['stem' if matches else 'fuzzy' for matches in all_matches]
+    misses = [i for i, matches in enumerate(all_matches) if matches is None]
+    self.stem_hits += len(targets) - len(misses)
+
+    # ...pare each miss's candidates down to its --regex significant files (None = ALL files)...
+    index = self.significant_index
+    significant_texts = [index.significant(target) if index else False for target in targets]
+    miss_targets = [targets[i] for i in misses]
+    subsets = [index.subset(target) if index else None for target in miss_targets]
+
+    # ...optionally swap ALL files for a trigram shortlist...
+    if self.ngram_index:
+      subsets = shortlist_subsets(self.ngram_index, miss_targets, subsets, self.shortlist_size, self.min_shortlist)
+    self.full_scans += sum(1 for target, subset in zip(miss_targets, subsets) if target and subset is None)
+    scored = [len(self.choices) if subset is None else len(subset) for target, subset in zip(miss_targets, subsets) if target]
+    self.fuzzy_scored += len(scored)
+    self.candidates_scored += sum(scored)
+    self.max_candidates = max([self.max_candidates, *scored])
+
+    # ...and score ALL of the misses in one batch.  Blank targets get matches = False.
+    fuzzy = self.pool.match(miss_targets, subsets)
+    for i, matches in zip(misses, fuzzy):
+      all_matches[i] = matches
+    self.fuzzy_matched += len(misses)
+
+    return [(significant_text, matches, method if matches else 'none')
+            for significant_text, matches, method in zip(significant_texts, all_matches, methods)]
+
+  # close( ) - Stop the matching worker processes, match( ) may not be called after this
+  def close(self):
+    self.pool.close( )
+
+
+# scorer_id(shortlist_size, min_shortlist) - Names the scoring behind a result, for MatchCache keys.  Both
+# engines give identical WRatio scores, but a trigram shortlist can change which files are scored at all.
+# ---------------------------------------------------------------------------------------
+def scorer_id(shortlist_size=0, min_shortlist=50):
+  return f"WRatio/shortlist={shortlist_size},{min_shortlist}" if shortlist_size else 'WRatio'
+
+
+# MatchCache(snapshot, regex, scorer, max_entries, filename) - Persistent memo of Matcher.match( ) results
+#
+# Each result is keyed by (target, tree snapshot ID, --regex, scorer) so a re-run of the same worksheet
+# against an unchanged tree only matches the rows that are new or edited.  The target is used exactly as
+# matched since both the stem lookup and the --regex look at its raw text.  Any change to the tree gives
+# a new snapshot ID, so stale file indices are never re-used.  The least recently used results are
+# dropped once there are more than `max_entries`.
+# ---------------------------------------------------------------------------------------
+class MatchCache:
+
+  def __init__(self, snapshot, regex=False, scorer='WRatio', max_entries=100000, filename=match_cache_file):
+    self.prefix = json.dumps([snapshot, regex or '', scorer])
+    self.max_entries = max_entries
+    self.filename = filename
+    self.entries = OrderedDict( )   # key: [significant_text, matches, method], least recently used first
+    self.hits = 0
+    self.misses = 0
+    self.load( )
+
+  # key(target) - Short, fixed-size key for one target under this snapshot, regex and scorer
+  def key(self, target):
+    return hashlib.sha1(f"{self.prefix}\0{target}".encode('utf-8', 'surrogateescape')).hexdigest( )[:24]
+
+  # load( ) - Read the saved results, an unreadable cache is simply an empty one
+  def load(self):
+    try:
+      with open(self.filename, 'r') as j:
+        self.entries = OrderedDict(json.load(j)['entries'])
+    except (OSError, ValueError, KeyError, TypeError):
+      self.entries = OrderedDict( )
+
+  # save( ) - Write the cache atomically, so neither an interrupted run nor two searches saving at
+  # once (e.g. two Streamlit sessions) can leave a broken file behind
+  def save(self):
+    folder = os.path.dirname(self.filename)
+    if folder:
+      os.makedirs(folder, exist_ok=True)
+    tmp = f"{self.filename}.{os.getpid( )}-{id(self)}.tmp"
+    with open(tmp, 'w') as j:
+      json.dump({'saved': time.time( ), 'entries': list(self.entries.items( ))}, j)
+    os.replace(tmp, self.filename)
+
+  # get(target) - The cached (significant_text, matches, method) of `target`, or None
+  def get(self, target):
+    key = self.key(target)
+    entry = self.entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries.move_to_end(key)
+    (significant_text, matches, method) = entry
+    return (significant_text, [tuple(m) for m in matches] if matches else matches, method)
+
+  # put(target, result) - Remember one Matcher.match( ) result
+  def put(self, target, result):
+    (significant_text, matches, method) = result
+    key = self.key(target)
+    self.entries[key] = [significant_text, [list(m) for m in matches] if matches else matches, method]
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
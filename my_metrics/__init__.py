@@ -0,0 +1,119 @@
+# my_metrics
+##
+## Run instrumentation shared by `network-file-finder.py`, `batch-file-finder.py` and `streamlit_app.py`.
+##
+## A Metrics object collects the wall time spent in each stage of a run (Google Sheets fetch, tree walk,
+## index build, matching, CSV and checkpoint writes, Azure uploads...) and counts such as files scanned,
+## candidates scored per target, match cache hits and bytes uploaded.  It is thread-safe, so the uploader
+## and a background tree walk can report into the same object.  Stages may overlap or nest (e.g. a tree walk
+## running alongside the Sheets fetch), so their times need not add up to the run's.  report( ) gives
+## printable lines, as_dict( ) and save( ) the same in JSON.
+##
+## profiled(filename) is an opt-in cProfile hook: a no-op without a filename, otherwise the code inside
+## it is profiled and the stats saved to `filename` (readable with `python -m pstats`).
+
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+
+
+# Metrics( ) - Stage wall times and counts of one run
+# ---------------------------------------------------------------------------------------
+class Metrics:
+
+  def __init__(self):
+    self.started = time.time( )
+    self.finished = None
+    self.stages = { }   # name: [seconds, calls], in the order stages first ran
+    self.counts = { }
+    self.lock = threading.Lock( )
+
+  # stage(name) - Context manager adding the time spent inside it to stage `name`
+  @contextlib.contextmanager
+  def stage(self, name):
+    started = time.perf_counter( )
+    try:
+      yield
+    finally:
+      self.add(name, time.perf_counter( ) - started)
+
+  # add(name, seconds, calls) - Add time measured elsewhere to stage `name`
+  def add(self, name, seconds, calls=1):
+    with self.lock:
+      stage = self.stages.setdefault(name, [0.0, 0])
+      stage[0] += seconds
+      stage[1] += calls
+
+  # count(name, n) - Add `n` to count `name`
+  def count(self, name, n=1):
+    with self.lock:
+      self.counts[name] = self.counts.get(name, 0) + n
+
+  # set(name, value) - Record a count or value outright
+  def set(self, name, value):
+    with self.lock:
+      self.counts[name] = value
+
+  def finish(self):
+    self.finished = time.time( )
+
+  # elapsed( ) - Seconds from start to finish( ), or to now
+  def elapsed(self):
+    return (self.finished or time.time( )) - self.started
+
+  def as_dict(self):
+    with self.lock:
+      return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+              'wall_seconds': round(self.elapsed( ), 3),
+              'stages': {name: {'seconds': round(seconds, 4), 'calls': calls} for name, (seconds, calls) in self.stages.items( )},
+              'counts': dict(self.counts)}
+
+  # report( ) - Printable summary lines: one per stage, then the counts
+  def report(self):
+    data = self.as_dict( )
+    wall = data['wall_seconds'] or 1
+    lines = [f"{'stage':<14} {'seconds':>9} {'calls':>7} {'of run':>7}"]
+    for name, stage in data['stages'].items( ):
+      lines.append(f"{name:<14} {stage['seconds']:9.3f} {stage['calls']:7d} {100 * stage['seconds'] / wall:6.1f}%")
+    lines.append(f"{'run':<14} {data['wall_seconds']:9.3f}")
+    for name, value in data['counts'].items( ):
+      lines.append(f"{name}: {value}")
+    return lines
+
+  # save(filename) - Write as_dict( ) to a JSON metrics file
+  def save(self, filename):
+    with open(filename, 'w') as f:
+      json.dump(self.as_dict( ), f, indent=2)
+
+
+# Profile(filename) - cProfile around a block of code, the stats saved to `filename` on exit
+# ---------------------------------------------------------------------------------------
+class Profile:
+
+  def __init__(self, filename):
+    self.filename = filename
+    self.profile = cProfile.Profile( )
+
+  def __enter__(self):
+    self.profile.enable( )
+    return self
+
+  def __exit__(self, *exc):
+    self.profile.disable( )
+    self.profile.dump_stats(self.filename)
+
+  # report(top) - The `top` functions by cumulative time, as printable lines
+  def report(self, top=15):
+    out = io.StringIO( )
+    pstats.Stats(self.profile, stream=out).sort_stats('cumulative').print_stats(top)
+    return [line for line in out.getvalue( ).splitlines( ) if line.strip( )]
+
+
+# profiled(filename) - A Profile of the block when `filename` is given, otherwise a no-op yielding None
+# ---------------------------------------------------------------------------------------
+def profiled(filename=None):
+  return Profile(filename) if filename else contextlib.nullcontext( )
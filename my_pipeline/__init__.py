@@ -0,0 +1,117 @@
+# my_pipeline
+##
+## Bounded, instrumented hand-off between the stages of `network-file-finder.py --pipeline`.
+##
+## A RowPipeline runs a consumer (e.g. the Azure uploader) in its own thread, fed one matched row at a
+## time through a bounded queue.  When the consumer falls behind the queue fills up and put( ) blocks
+## the producer (the matching loop): that is the backpressure that keeps memory flat.  Each side's
+## busy and waiting time is recorded so the run can report where the time went.
+
+import time
+import queue
+import threading
+
+_done = object( )   # end-of-rows marker
+
+
+# Stage(name) - Rows and timing of one pipeline stage
+# ---------------------------------------------------------------------------------------
+class Stage:
+
+  def __init__(self, name):
+    self.name = name
+    self.rows = 0
+    self.started = None
+    self.finished = None
+    self.waited = 0.0   # seconds spent blocked on the queue
+
+  def start(self):
+    if self.started is None:
+      self.started = time.time( )
+
+  def finish(self):
+    self.finished = time.time( )
+
+  # elapsed( ) - Seconds from start( ) to finish( ), or to now if still running
+  def elapsed(self):
+    if self.started is None:
+      return 0.0
+    return (self.finished or time.time( )) - self.started
+
+  # report( ) - One line summary: rows, rate and time spent waiting
+  def report(self):
+    elapsed = self.elapsed( )
+    rate = self.rows / elapsed if elapsed > 0 else 0.0
+    return f"{self.name}: {self.rows} rows in {elapsed:.1f}s ({rate:.1f} rows/s), {self.waited:.1f}s waiting on the queue"
+
+
+# RowPipeline(consume, maxsize) - Feed rows to consume(rows, *args) running in a thread of its own
+#
+# consume( ) receives an iterator over the rows put( ) here, ending when close( ) is called.  If it stops
+# early the remaining rows are drained (so the producer never blocks forever), and close( ) re-raises any
+# error it stopped with.
+# ---------------------------------------------------------------------------------------
+class RowPipeline:
+
+  def __init__(self, consume, maxsize=500):
+    self.consume = consume
+    self.queue = queue.Queue(maxsize)
+    self.producer = Stage('match')
+    self.consumer = Stage('upload')
+    self.thread = None
+    self.error = None
+    self.ended = False
+    self.peak = 0   # most rows ever waiting in the queue
+
+  # start(*args) - Start the consumer thread, consume(rows, *args)
+  def start(self, *args):
+    self.producer.start( )
+    self.thread = threading.Thread(target=self.run, args=args, daemon=True)
+    self.thread.start( )
+
+  def run(self, *args):
+    self.consumer.start( )
+    try:
+      self.consume(self.rows( ), *args)
+    except BaseException as e:
+      self.error = e
+    if not self.ended:
+      for row in self.rows( ):
+        pass   # drain, so put( ) never blocks on a consumer that stopped early
+    self.consumer.finish( )
+
+  # rows( ) - The consumer side: yield rows until close( )
+  def rows(self):
+    while True:
+      waited = time.time( )
+      row = self.queue.get( )
+      self.consumer.waited += time.time( ) - waited
+      if row is _done:
+        self.ended = True
+        return
+      self.consumer.rows += 1
+      yield row
+
+  # put(row) - The producer side: hand over one row, blocking while the queue is full
+  def put(self, row):
+    self.producer.start( )
+    waited = time.time( )
+    self.queue.put(row)
+    self.producer.waited += time.time( ) - waited
+    self.producer.rows += 1
+    self.peak = max(self.peak, self.queue.qsize( ))
+
+  # close( ) - No more rows: wait for the consumer to finish, re-raising its error if it failed
+  def close(self):
+    self.producer.finish( )
+    if self.thread is None:
+      return
+    self.queue.put(_done)
+    self.thread.join( )
+    self.thread = None
+    if self.error is not None:
+      raise self.error
+
+  # report( ) - Per-stage summary lines
+  def report(self):
+    return [self.producer.report( ), self.consumer.report( ), f"queue: at most {self.peak} of {self.queue.maxsize} rows waiting"]
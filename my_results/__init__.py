@@ -0,0 +1,113 @@
+# my_results
+##
+## Output of fuzzy search results shared by `network-file-finder.py` and `streamlit_app.py`.
+##
+## The MatchListWriter streams `match-list.csv` one row at a time as each match is reported,
+## flushing every few rows (or seconds) so a long search can be followed with `tail -f`.
+## A Checkpoint records the same rows so an interrupted search can pick up where it left off.
+
+import os
+import csv
+import json
+import time
+
+match_list_file = 'match-list.csv'
+header = ['No.', 'Target', 'Significant --regex', 'Best Match Score', 'Best Match', 'Best Match Path', '2nd Match Score', '2nd Match', '2nd Match Path', '3rd Match Score', '3rd Match', '3rd Match Path', 'Match Method']
+
+
+# MatchListWriter(filename, flush_rows, flush_seconds) - Streaming writer for match-list.csv
+# ---------------------------------------------------------------------------------------
+class MatchListWriter:
+
+  def __init__(self, filename=match_list_file, flush_rows=25, flush_seconds=2.0):
+    self.flush_rows = flush_rows
+    self.flush_seconds = flush_seconds
+    self.csvfile = open(filename, 'w', newline='')
+    self.writer = csv.writer(self.csvfile, quoting=csv.QUOTE_MINIMAL)
+    self.writer.writerow(header)
+    self.flush( )
+
+  # write(line) - Append one result row, flushing it to disk now and then
+  def write(self, line):
+    self.writer.writerow(line)
+    self.pending += 1
+    if self.pending >= self.flush_rows or time.time( ) - self.flushed_at >= self.flush_seconds:
+      self.flush( )
+
+  def flush(self):
+    self.csvfile.flush( )
+    self.pending = 0
+    self.flushed_at = time.time( )
+
+  def close(self):
+    if not self.csvfile.closed:
+      self.flush( )
+      self.csvfile.close( )
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close( )
+
+
+# Checkpoint(meta, filename) - Record of finished rows so an interrupted search can be resumed
+#
+# The checkpoint is a JSON-lines file: the first line holds `meta` (tree snapshot ID and search
+# settings), every following line one finished match-list.csv row.  A resumed search only re-uses
+# rows when `meta` is unchanged and the row's target is still the same.
+# ---------------------------------------------------------------------------------------
+checkpoint_file = 'match-list.checkpoint'
+
+class Checkpoint:
+
+  def __init__(self, meta, filename=checkpoint_file):
+    self.meta = meta
+    self.filename = filename
+    self.file = None
+
+  # resume(targets) - Rows already finished, {counter: csv_line}.  Only the checkpoint is trusted: every row
+  # is checkpointed before it is written to match-list.csv, and a match-list.csv left by an earlier, finished
+  # search may hold rows of other settings.  Nothing is re-used unless the checkpoint was written for the
+  # same tree and settings.
+  def resume(self, targets):
+    done = { }
+    try:
+      with open(self.filename, 'r') as saved:
+        if json.loads(saved.readline( )) != self.meta:
+          return { }   # a different tree or different settings, start over
+        for row in saved:
+          try:
+            line = json.loads(row)
+            counter = int(line[0])
+          except ValueError:
+            break      # a row cut short by the interruption
+          except (TypeError, IndexError):
+            continue
+          if 0 < counter <= len(targets) and line[1] == targets[counter - 1]:
+            done[counter] = line
+    except (OSError, ValueError):
+      return { }       # no checkpoint, nothing to re-use
+    return done
+
+  # start(done) - Begin a new checkpoint, carrying over the rows that are already done
+  def start(self, done=None):
+    self.file = open(self.filename, 'w')
+    self.file.write(json.dumps(self.meta) + '\n')
+    for counter in sorted(done or { }):
+      self.file.write(json.dumps(done[counter]) + '\n')
+    self.file.flush( )
+
+  # add(line) - Record one finished row
+  def add(self, line):
+    self.file.write(json.dumps(line) + '\n')
+    self.file.flush( )
+
+  # finish( ) - The search is complete, the checkpoint is no longer needed
+  def finish(self):
+    if self.file:
+      self.file.close( )
+    try:
+      os.remove(self.filename)
+    except OSError:
+      pass
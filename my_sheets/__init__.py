@@ -0,0 +1,172 @@
+# my_sheets
+##
+## Google Sheets access shared by `network-file-finder.py` and `streamlit_app.py`.
+##
+## A SheetCache holds the authorized gspread client, the opened spreadsheets, their worksheet lists
+## and worksheet header rows, so a Streamlit rerun (every widget click) or a second search of the
+## same sheet no longer re-authenticates and re-fetches them.  Cached values expire after `ttl`
+## seconds, or when invalidate( ) is called.  The client comes from `client_factory`, normally
+## gspread.service_account, so any object with the same methods (e.g. a local fake) can stand in.
+##
+## write_back( ) puts the best match, its score and path for every matched row back into the worksheet
+## with a few batched range updates instead of one API call per cell.
+
+import re
+import time
+import threading
+import gspread as gs
+from gspread.utils import rowcol_to_a1
+
+write_back_header = ['Best Match Score', 'Best Match', 'Best Match Path']
+max_cells_per_call = 10000   # Cells sent in one batch_update( ), well under the Sheets API payload limits
+max_rows_per_range = 1000    # Rows in one range of a batch_update( )
+
+
+# SheetCache(ttl, client_factory) - TTL cache of the gspread client, spreadsheets, worksheets and headers
+# ---------------------------------------------------------------------------------------
+class SheetCache:
+
+  def __init__(self, ttl=600, client_factory=None):
+    self.ttl = ttl
+    self.client_factory = client_factory or gs.service_account
+    self.entries = { }   # key: (loaded_at, value)
+    self.lock = threading.Lock( )
+    self.hits = 0
+    self.misses = 0
+
+  # fetch(key, loader) - The cached value of `key`, or the result of loader( ) when missing or expired
+  def fetch(self, key, loader):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry and time.time( ) - entry[0] < self.ttl:
+        self.hits += 1
+        return entry[1]
+      self.misses += 1
+
+    value = loader( )
+    with self.lock:
+      self.entries[key] = (time.time( ), value)
+    return value
+
+  # client( ) - The authorized gspread client
+  def client(self):
+    return self.fetch(('client',), self.client_factory)
+
+  # spreadsheet(url) - The opened spreadsheet at `url`
+  def spreadsheet(self, url):
+    return self.fetch(('spreadsheet', url), lambda: self.client( ).open_by_url(url))
+
+  # worksheets(url) - The list of worksheets (tabs) in the spreadsheet at `url`
+  def worksheets(self, url):
+    return self.fetch(('worksheets', url), lambda: self.spreadsheet(url).worksheets( ))
+
+  # worksheet(url, title=None, gid=None) - One worksheet picked by title or gid from the cached list
+  def worksheet(self, url, title=None, gid=None):
+    for w in self.worksheets(url):
+      if (title is not None and w.title == title) or (gid is not None and w.id == gid):
+        return w
+    raise gs.WorksheetNotFound(title if title is not None else gid)
+
+  # header(url, title, row) - The values of one worksheet's header row
+  def header(self, url, title, row=1):
+    return self.fetch(('header', url, title, row), lambda: self.worksheet(url, title).row_values(row))
+
+  # invalidate(url) - Forget everything cached for one spreadsheet, or EVERYTHING (client too) if url is None
+  def invalidate(self, url=None):
+    with self.lock:
+      if url is None:
+        self.entries.clear( )
+      else:
+        for key in [k for k in self.entries if len(k) > 1 and k[1] == url]:
+          del self.entries[key]
+
+  # stats( ) - (cached entries, hits, misses) for display
+  def stats(self):
+    with self.lock:
+      return (len(self.entries), self.hits, self.misses)
+
+
+# extract_sheet_id_from_url(url) - The worksheet gid named by a Google Sheet URL's '#gid=', as an int
+# ---------------------------------------------------------------------------------------
+def extract_sheet_id_from_url(url):
+  res = re.compile(r'#gid=([0-9]+)').search(url or '')
+  if res:
+    return int(res.group(1))
+  raise ValueError('No valid sheet ID found in the specified Google Sheet.')
+
+
+# column_number(letters) - Spreadsheet column letters to a number, A = 1, Z = 26, AA = 27, or False if invalid
+# ---------------------------------------------------------------------------------------
+def column_number(letters):
+  letters = (letters or '').strip( ).upper( )
+  if not (letters.isalpha( ) and letters.isascii( )):
+    return False
+  n = 0
+  for c in letters:
+    n = n * 26 + 1 + ord(c) - ord('A')
+  return n
+
+
+# result_ranges(csvlines, first_column, skip_rows, chunk_rows) - batch_update( ) ranges holding the best match
+# score, match and path of every match-list.csv row, in runs of consecutive worksheet rows
+#
+# Row N of the results (csv_line[0] == 'N') came from worksheet row N + skip_rows.  When skip_rows > 0 the
+# first range also labels the three columns in worksheet row 1.
+# ---------------------------------------------------------------------------------------
+def result_ranges(csvlines, first_column, skip_rows=1, chunk_rows=max_rows_per_range):
+  rows = { }
+  for line in csvlines:
+    try:
+      rows[int(line[0]) + skip_rows] = [int(line[3]), line[4], line[5]]
+    except (ValueError, IndexError):
+      continue   # not a result row
+  if skip_rows > 0:
+    rows[1] = list(write_back_header)
+
+  ranges = [ ]
+  run = [ ]
+  for row in sorted(rows):
+    if run and (row != run[-1] + 1 or len(run) >= chunk_rows):
+      ranges.append(run)
+      run = [ ]
+    run.append(row)
+  if run:
+    ranges.append(run)
+
+  last_column = first_column + len(write_back_header) - 1
+  return [{'range': f"{rowcol_to_a1(run[0], first_column)}:{rowcol_to_a1(run[-1], last_column)}",
+           'values': [rows[row] for row in run]} for run in ranges]
+
+
+# write_back(worksheet, csvlines, first_column, skip_rows, max_cells) - Write the best match columns of
+# `csvlines` into `worksheet` starting at `first_column` (A = 1).  Returns the number of API calls made.
+# ---------------------------------------------------------------------------------------
+def write_back(worksheet, csvlines, first_column, skip_rows=1, max_cells=max_cells_per_call):
+  ranges = result_ranges(csvlines, first_column, skip_rows)
+  if not ranges:
+    return 0
+  calls = 0
+
+  # The grid must be wide enough for our three columns
+  last_column = first_column + len(write_back_header) - 1
+  if worksheet.col_count < last_column:
+    worksheet.add_cols(last_column - worksheet.col_count)
+    calls += 1
+
+  # Pack whole ranges into as few batch_update( ) calls as max_cells allows
+  batch = [ ]
+  cells = 0
+  for r in ranges:
+    size = len(r['values']) * len(write_back_header)
+    if batch and cells + size > max_cells:
+      worksheet.batch_update(batch, raw=True)
+      calls += 1
+      batch = [ ]
+      cells = 0
+    batch.append(r)
+    cells += size
+  if batch:
+    worksheet.batch_update(batch, raw=True)
+    calls += 1
+
+  return calls
@@ -0,0 +1,302 @@
+# my_tree
+##
+## Directory tree scanning shared by `network-file-finder.py` and `streamlit_app.py`.
+##
+## A TreeIndex keeps a persistent, per-root record of every directory's mtime and its
+## (non-hidden) files and sub-directories in the `.tree-index/` folder.  On later runs only the
+## directories whose mtime has changed are listed again, every other directory costs just one
+## stat( ) call, which is MUCH cheaper than a full listing on our SMB-mounted /Volumes/... roots.
+## Directories may also be scanned concurrently (see TreeIndex.refresh) to overlap network round trips.
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from array import array
+from itertools import repeat
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+index_dir = '.tree-index'   # Default folder for persistent tree indexes
+racy_seconds = 2            # Directories modified this close to their listing are re-listed next time
+
+
+# list_dir(dirpath) - List one directory, returning sorted lists of non-hidden files and sub-directories
+# Exclusion of dot files per https://stackoverflow.com/questions/13454164/os-walk-without-hidden-folders
+# ---------------------------------------------------------------------------------------
+def list_dir(dirpath):
+  files = [ ]
+  subdirs = [ ]
+  try:
+    with os.scandir(dirpath) as entries:
+      for entry in entries:
+        if entry.name[0] == '.':
+          continue
+        try:
+          is_dir = entry.is_dir( )
+        except OSError:
+          is_dir = False
+        if is_dir:
+          if not entry.is_symlink( ):   # like os.walk( ), do not follow symlinked directories
+            subdirs.append(entry.name)
+        else:
+          files.append(entry.name)
+  except OSError:
+    pass   # like os.walk( ), silently skip directories we cannot read
+
+  files.sort( )
+  subdirs.sort( )
+  return (files, subdirs)
+
+
+# TreeIndex(root) - Persistent, incrementally refreshed index of a directory tree
+# ---------------------------------------------------------------------------------------
+class TreeIndex:
+
+  def __init__(self, root, folder=index_dir):
+    self.root = root
+    self.folder = folder
+    self.dirs = { }      # dirpath: [mtime, [files], [subdirs]] in top-down (os.walk) order
+    self.relisted = 0
+    self.reused = 0
+
+  # index_file( ) - The .json file holding this root's index
+  def index_file(self):
+    key = hashlib.sha1(os.path.abspath(self.root).encode('utf-8')).hexdigest( )[:16]
+    return os.path.join(self.folder, f"{key}.json")
+
+  # load( ) - Read a previously saved index, returns False if there is none (or it is unreadable)
+  def load(self):
+    try:
+      with open(self.index_file( ), 'r') as j:
+        saved = json.load(j)
+      if saved.get('root') == self.root:
+        self.dirs = saved['dirs']
+        return True
+    except (OSError, ValueError, KeyError):
+      pass
+    self.dirs = { }
+    return False
+
+  # save( ) - Write the index, atomically so an interrupted run never leaves a broken file behind
+  def save(self):
+    os.makedirs(self.folder, exist_ok=True)
+    target = self.index_file( )
+    tmp = f"{target}.tmp"
+    with open(tmp, 'w') as j:
+      json.dump({'root': self.root, 'saved': time.time( ), 'dirs': self.dirs}, j)
+    os.replace(tmp, target)
+
+  # scan_dir(dirpath, old) - stat( ) one directory and re-use its old entry or list it again
+  # Returns (entry, relisted) or None if the directory has vanished
+  def scan_dir(self, dirpath, old):
+    try:
+      mtime = os.stat(dirpath).st_mtime
+    except OSError:
+      return None
+
+    entry = old.get(dirpath)
+    if entry and entry[0] is not None and entry[0] == mtime:
+      return (entry, False)
+
+    listed_at = time.time( )
+    files, subdirs = list_dir(dirpath)
+    if listed_at - mtime < racy_seconds:
+      mtime = None   # changed too recently to trust, force a fresh listing next time
+    return ([mtime, files, subdirs], True)
+
+  # refresh(workers) - Re-list only those directories whose mtime changed since the last refresh.
+  # With workers > 1 directories are scanned concurrently by a bounded pool of threads, which
+  # hides the per-directory round trip of a network mount.  The result order is the same either way.
+  def refresh(self, workers=1):
+    old = self.dirs
+    scanned = { }
+
+    if workers > 1:
+      with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(self.scan_dir, self.root, old): self.root}
+        while pending:
+          done, _ = wait(pending, return_when=FIRST_COMPLETED)
+          for future in done:
+            dirpath = pending.pop(future)
+            result = future.result( )
+            if result:
+              scanned[dirpath] = result
+              for name in result[0][2]:
+                subpath = os.path.join(dirpath, name)
+                pending[pool.submit(self.scan_dir, subpath, old)] = subpath
+    else:
+      stack = [self.root]
+      while stack:
+        dirpath = stack.pop( )
+        result = self.scan_dir(dirpath, old)
+        if result:
+          scanned[dirpath] = result
+          for name in reversed(result[0][2]):
+            stack.append(os.path.join(dirpath, name))
+
+    # Rebuild the index in top-down (os.walk) order so the file lists are deterministic
+    new = { }
+    self.relisted = 0
+    self.reused = 0
+    stack = [self.root]
+    while stack:
+      dirpath = stack.pop( )
+      if dirpath not in scanned:
+        continue
+      entry, relisted = scanned[dirpath]
+      new[dirpath] = entry
+      if relisted:
+        self.relisted += 1
+      else:
+        self.reused += 1
+      for name in reversed(entry[2]):
+        stack.append(os.path.join(dirpath, name))
+
+    self.dirs = new
+    return self
+
+  # file_table( ) - Return the indexed files as a FileTable, in top-down (os.walk) order
+  def file_table(self):
+    table = FileTable( )
+    for dirpath, (mtime, files, subdirs) in self.dirs.items( ):
+      table.add_dir(dirpath, files)
+    return table
+
+
+# FileTable( ) - Compact, columnar table of the files in a scanned tree
+#
+# Replaces the parallel big_file_list / big_path_list pair.  Every directory path is stored ONCE in
+# `dirs`, each file just records a 4-byte directory id in the `dir_ids` array.  `names` stays a plain
+# list because the matching engines score it directly.
+# ---------------------------------------------------------------------------------------
+class FileTable:
+  __slots__ = ('names', 'dirs', 'dir_ids')
+
+  def __init__(self):
+    self.names = [ ]            # filenames, index i is file i
+    self.dirs = [ ]             # interned directory table
+    self.dir_ids = array('I')   # file i lives in dirs[dir_ids[i]]
+
+  # add_dir(dirpath, files) - Append one directory's files
+  def add_dir(self, dirpath, files):
+    if files:
+      self.dir_ids.extend(repeat(len(self.dirs), len(files)))
+      self.dirs.append(dirpath)
+      self.names.extend(files)
+
+  def __len__(self):
+    return len(self.names)
+
+  # __getitem__(i) - The (name, dir) pair of file i
+  def __getitem__(self, i):
+    return (self.names[i], self.dirs[self.dir_ids[i]])
+
+  # dir(i) - The directory holding file i
+  def dir(self, i):
+    return self.dirs[self.dir_ids[i]]
+
+  # path(i) - The full path of file i
+  def path(self, i):
+    return os.path.join(self.dirs[self.dir_ids[i]], self.names[i])
+
+  # snapshot_id( ) - Fingerprint of exactly which files this table holds, and where
+  def snapshot_id(self):
+    digest = hashlib.sha1( )
+    for name in self.dirs + self.names:
+      digest.update(name.encode('utf-8', 'surrogateescape') + b'\0')
+    digest.update(self.dir_ids.tobytes( ))
+    return digest.hexdigest( )
+
+
+# table_bytes(table) - Rough memory footprint of a FileTable, used to bound the TreeCache
+# ---------------------------------------------------------------------------------------
+def table_bytes(table):
+  size = sys.getsizeof(table.names) + sys.getsizeof(table.dirs) + sys.getsizeof(table.dir_ids)
+  size += sum(sys.getsizeof(name) for name in table.names)
+  size += sum(sys.getsizeof(d) for d in table.dirs)
+  return size
+
+
+# TreeCache(ttl, max_bytes) - Process-wide cache of FileTable snapshots keyed by root path
+#
+# Shared by every Streamlit session (see tree_cache( ) in streamlit_app.py).  A snapshot older than
+# `ttl` seconds is refreshed through the persistent TreeIndex on its next use, and the least recently
+# used snapshots are dropped whenever the cache grows past `max_bytes`.
+# ---------------------------------------------------------------------------------------
+class TreeCache:
+
+  def __init__(self, ttl=900, max_bytes=1024 * 1024 * 1024):
+    self.ttl = ttl
+    self.max_bytes = max_bytes
+    self.entries = OrderedDict( )   # root: (loaded_at, table, size), least recently used first
+    self.loading = { }              # root: Lock, so two sessions never walk the same root at once
+    self.lock = threading.Lock( )
+
+  # get(root, workers) - Return (FileTable, hit) for `root`, loading or refreshing it when needed
+  def get(self, root, workers=1):
+    with self.lock:
+      root_lock = self.loading.setdefault(root, threading.Lock( ))
+
+    with root_lock:
+      with self.lock:
+        entry = self.entries.get(root)
+        if entry and time.time( ) - entry[0] < self.ttl:
+          self.entries.move_to_end(root)
+          return (entry[1], True)
+
+      (index, table) = load_tree(root, workers)
+      size = table_bytes(table)
+
+      with self.lock:
+        self.entries[root] = (time.time( ), table, size)
+        self.entries.move_to_end(root)
+        self.evict( )
+      return (table, False)
+
+  # evict( ) - Drop least recently used snapshots until we fit in max_bytes (always keep the newest)
+  def evict(self):
+    while len(self.entries) > 1 and sum(entry[2] for entry in self.entries.values( )) > self.max_bytes:
+      self.entries.popitem(last=False)
+
+  # invalidate(root) - Forget one root's snapshot, or every snapshot if root is None
+  def invalidate(self, root=None):
+    with self.lock:
+      if root is None:
+        self.entries.clear( )
+      else:
+        self.entries.pop(root, None)
+
+  # stats( ) - (snapshots, total bytes) for display
+  def stats(self):
+    with self.lock:
+      return (len(self.entries), sum(entry[2] for entry in self.entries.values( )))
+
+
+# load_tree(path, workers) - Load, refresh and save the index for `path`, return (index, FileTable)
+# ---------------------------------------------------------------------------------------
+def load_tree(path, workers=1, folder=index_dir):
+  index = TreeIndex(path, folder)
+  index.load( )
+  index.refresh(workers)
+  try:
+    index.save( )
+  except OSError:
+    pass   # an unsaved index only costs us a full listing next time
+  return (index, index.file_table( ))
+
+
+# load_tree_async(path, workers) - Start load_tree( ) in a background thread, returns a Future of (index, FileTable)
+# so the walk can overlap other slow work, e.g. fetching the worksheet.  The thread never delays exit.
+# ---------------------------------------------------------------------------------------
+def load_tree_async(path, workers=1, folder=index_dir):
+  future = Future( )
+  def run( ):
+    try:
+      future.set_result(load_tree(path, workers, folder))
+    except BaseException as e:
+      future.set_exception(e)
+  threading.Thread(target=run, daemon=True).start( )
+  return future
@@ -11,21 +11,24 @@
 ## for input into the `object_location`, `image_small`, and `image_thumb` columns of a CollectionBuilder CSV ## file or Google Sheet.
 
 import sys
+import time
 import getopt
-import re
-import gspread as gs
 import csv
 import os.path
-from fuzzywuzzy import fuzz, process
 import os, uuid
 from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
 
 # Local packages
 import my_colorama
+import my_tree
+import my_matcher
+import my_sheets
+import my_azure
+import my_pipeline
+import my_engine
+import my_metrics
 
 # Globals
-azure_base_url = "https://dgobjects.blob.core.windows.net/"
 column = 7     # Default column for filenames is 'G' = 7 
 skip_rows = 1  # Default number of header rows to skip = 1
 levehstein_ratio = 90
@@ -35,10 +38,29 @@ copy_to_azure = False
 extended = False
 grinnell = False
 use_match_list = False
+walk_workers = 1   # Number of directories to list concurrently, 1 = serial
+engine_name = 'auto'   # Fuzzy matching engine, see my_matcher.engines
+shortlist_size = 0     # Files shortlisted per target by trigram overlap, 0 = score ALL files
+min_shortlist = 50     # Targets sharing trigrams with fewer files than this get a full scan
+match_workers = 1      # Number of processes matching targets, 1 = match in this process
+checkpoint_rows = 250  # Rows matched (and checkpointed) per batch
+resume = False         # Re-use the rows an interrupted search already finished
+match_cache_size = 100000   # Match results remembered between runs, 0 = no match cache
+upload_workers = 1          # Number of concurrent Azure uploads, 1 = one file at a time
+block_size_mb = 8           # Block size for large file uploads, in MB
+block_workers = 4           # Blocks of one large file staged concurrently
+max_buffer_mb = 256         # Cap on block data held in memory across ALL uploads, in MB
+pipelined = False           # Upload each matched row while later rows are still being matched
+queue_rows = 500            # Matched rows allowed to wait for the uploader before matching pauses
+pipeline = None
+write_back_column = False   # First of three worksheet columns to receive the best match score, match and path
+metrics_file = False        # JSON file to receive the run's metrics, stage times and counts
+profile_file = False        # cProfile stats of the matching loop are saved here, False = no profiling
+metrics = my_metrics.Metrics( )   # Stage wall times and counts of this run, summarized at the end
+sheets = my_sheets.SheetCache( )   # The gspread client, spreadsheet and worksheets, opened once
 counter = 0
 csvlines = [ ]
-big_file_list = [ ]   # need a list of just filenames...
-big_path_list = [ ]   # ...and parallel list of just the paths
+tree = None    # The scanned --tree-path as a my_tree.FileTable
 significant_file_list = [ ]
 significant_path_list = [ ] 
 significant_dict = { }
@@ -47,145 +69,119 @@ significant_dict = { }
 # --- Function definitions
 
 
-# BIG_function( ) - The old processing guts of this script made into a function
+# BIG_function( ) - The old processing guts of this script made into a function, returns (csvlines, FileTable)
 # --------------------------------------------------------------------------------------
-def BIG_function(kept_file_list, path, counter):
+def BIG_function(kept_file_list, path, counter, pipeline=None):
 
   csvlines = [ ]
+  filenames = [ ]
+
+  # Start walking the --tree-path now, in the background, so it overlaps fetching the worksheet filenames
+  scan_started = time.time( )
+  scan = my_tree.load_tree_async(path, walk_workers)
+  scan.add_done_callback(lambda done: metrics.add('tree_walk', time.time( ) - scan_started))
 
   # Check the --kept-file-list switch.  If it is True then attempt to open the file-list.tmp file 
   # saved from a previous run.  The intent is to cut-down on Google API calls.
   if kept_file_list:
     try:
-      with open('file-list.tmp', 'r') as file_list:
-        for filename in file_list:
-          if filename:
-            filenames.append(filename.strip( ))
-          else: 
-            filenames.append("")
-
+      filenames = my_engine.read_file_list( )
     except Exception as e:
       kept_file_list = False
       pass  
 
-  # If we don't have a kept file list... Open the Google service account and sheet
+  # If we don't have a kept file list... Open the Google service account, sheet and worksheet (once, via the cache)
   else:
-    try:
-      sa = gs.service_account()
-    except Exception as e:
-      my_colorama.red(e)
-    
-    try:
-      sh = sa.open_by_url(sheet)
-    except Exception as e:
-      my_colorama.red(e)
-  
-    gid = int(extract_sheet_id_from_url(sheet))
-    worksheets = sh.worksheets()
-    worksheet = [w for w in sh.worksheets() if w.id == gid]
+    gid = my_sheets.extract_sheet_id_from_url(sheet)
+    with metrics.stage('sheets'):
+      try:
+        worksheet = sheets.worksheet(sheet, gid=gid)
+      except Exception as e:
+        my_colorama.red(e)
+        exit( )
     
-    # Grab all filenames from --column 
-    filenames = worksheet[0].col_values(column)  
+      # Grab all filenames from --column 
+      filenames = worksheet.col_values(column)  
     try:
-      with open('file-list.tmp', 'w') as file_list:
-        for filename in filenames:
-          file_list.write(f"{filename}\n")
+      my_engine.save_file_list(filenames)
     except Exception as e:
       my_colorama.red("Unable to open temporary file 'file-list.tmp' for writing.")
       exit( )
 
-    # Grab all non-hidden filenames from the target directory tree so we only have to get the list once
-    # Exclusion of dot files per https://stackoverflow.com/questions/13454164/os-walk-without-hidden-folders
-
-    for root, dirs, files in os.walk(path):
-      files = [f for f in files if not f[0] == '.']
-      dirs[:] = [d for d in dirs if not d[0] == '.']
-      for filename in files:
-        big_path_list.append(root)
-        big_file_list.append(filename)
+  # Grab all non-hidden filenames from the target directory tree so we only have to get the list once.
+  # The persistent tree index only re-lists directories whose mtime changed since the last run.
+  (tree_index, tree) = scan.result( )
+  metrics.set('files_scanned', len(tree))
+  metrics.set('directories_listed', tree_index.relisted)
+  metrics.set('directories_unchanged', tree_index.reused)
+  my_colorama.blue(f"Tree index for '{path}': {tree_index.relisted} directories listed, {tree_index.reused} unchanged, ready after {time.time( ) - scan_started:.1f}s.")
 
-    # Check for ZERO network files in the big_file_list
-    if len(big_file_list) == 0:
-      my_colorama.red(f"The specified --tree-path of '{path}' returned NO files!  Check your path specification and network connection!\n")
-      exit( )
-
-    # Report our --regex option...
-    if significant:
-      my_colorama.green(f"\nProcessing only files matching signifcant --regex of '{significant}'!")
-    else:
-      my_colorama.green(f"\nNo --regex specified, matching will consider ALL paths and files.")
-
-    # Now the main matching loop...
-    for x in range(len(filenames)):
-      if x < skip_rows:  # skip this row if instructed to do so 
-        my_colorama.yellow(f"Skipping match for '{filenames[x]}' in worksheet row {x}")
-        continue         # move on and process the next row
-      
-      counter += 1
-      target = filenames[x]
-      
-      # If --grinnell is specified and the 'target' begins with 'grinnell_' AND does not contain '_OBJ'... make it so
-      if grinnell and ('grinnell_' in target) and ('_OBJ' not in target):
-        target += '_OBJ.'
-
-      my_colorama.green(f"\n{counter}. Finding best fuzzy filename matches for '{target}'...")
-      csv_line = [ ]  
-      significant_text = ''
-
-      (significant_text, significant_file_list, significant_path_list, significant_dict) = build_lists_and_dict(significant, target, big_file_list, big_path_list)    
-
-      report = "None"
-      if significant_text:
-        my_colorama.blue(f"  Significant string is: '{significant_text}'.")
-        report = significant_text
-      
-      # If target is blank, skip the search and set matches = False
-      matches = False
-      if len(target) > 0:
-        matches = process.extract(target, significant_dict, limit=3)
-      
-      # Append new line to CSV regardless if there was a match or not
-      csv_line.append(f"{counter}")
-      csv_line.append(target)
-      csv_line.append(report)
-
-      # Report the top three matches
-      if matches:
-        for found, (match, score, index) in enumerate(matches):
-          path = significant_path_list[index]
-          csv_line.append(f"{score}")
-          csv_line.append(match)
-          csv_line.append(path)
-          if found==0: 
-            # txt = ' | '.join(csv_line)
-            my_colorama.green("!!! Found BEST matching file: {}".format(csv_line))
+  # Check for ZERO network files in the tree
+  if len(tree.names) == 0:
+    my_colorama.red(f"The specified --tree-path of '{path}' returned NO files!  Check your path specification and network connection!\n")
+    exit( )
 
+  # Report our --regex option...
+  if significant:
+    my_colorama.green(f"\nProcessing only files matching signifcant --regex of '{significant}'!")
+  else:
+    my_colorama.green(f"\nNo --regex specified, matching will consider ALL paths and files.")
+
+  # Collect the targets...
+  (targets, skipped) = my_engine.build_targets(filenames, skip_rows, grinnell)
+  for (x, filename) in skipped:
+    my_colorama.yellow(f"Skipping match for '{filename}' in worksheet row {x}")
+
+  # The engine, match cache, stem / --regex / trigram indexes and checkpoint for the whole search
+  search = my_engine.Search(tree, targets, significant, engine_name, shortlist_size, min_shortlist, match_workers,
+                            match_cache_size, resume, grinnell, skip_rows, checkpoint_rows, output_to_csv, metrics)
+  if shortlist_size:
+    my_colorama.blue(f"Using trigram shortlists of up to {shortlist_size} files per target.")
+  if resume:
+    my_colorama.blue(f"Resuming: {len(search.done)} of {len(targets)} rows are already finished.")
+
+  # With --pipeline, the uploader starts now and takes each row as soon as it is decided
+  if pipeline:
+    pipeline.start(tree)
+
+  my_colorama.green(f"\nFinding best fuzzy filename matches for {len(targets) - len(search.done)} targets using the '{search.engine.name}' engine...")
+
+  # Now the main matching loop, the search yields every row in order as it is decided.  With --profile the
+  # whole loop runs under cProfile (only this process, not any --workers matching processes)...
+  with my_metrics.profiled(profile_file) as profile:
+    for row in search.rows( ):
+      csvlines.append(row.csv_line)
+      if pipeline:
+        pipeline.put(row.csv_line)
+
+      # A row finished by an interrupted run was already reported
+      if row.resumed:
+        continue
+
+      my_colorama.green(f"\n{row.counter}. Best fuzzy filename matches for '{row.target}'...")
+      if row.significant_text:
+        my_colorama.blue(f"  Significant string is: '{row.significant_text}'.")
+
+      # Report the best match, or the lack of one
+      if row.matches:
+        my_colorama.green("!!! Found BEST matching file: {}".format(row.csv_line[:6]))
       else:
-        csv_line.append('0')
-        csv_line.append('NO match')
-        csv_line.append('NO match')
-        my_colorama.red("*** Found NO match for: {}".format(' | '.join(csv_line)))
-
-      # Save this fuzzy search result in 'csvlines' for return
-      csvlines.append(csv_line)
-
-    # If --output-csv is true, open a .csv file to receive the matching filenames and add a heading
-    if output_to_csv:
-      with open('match-list.csv', 'w', newline='') as csvfile:
-        listwriter = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
+        my_colorama.red("*** Found NO match for: {}".format(' | '.join(row.csv_line[:6])))
 
-        if significant:
-          significant_header = f"'{significant}' Match"
-        else:  
-          significant_header = "Undefined"
+  if profile:
+    my_colorama.blue(f"\nProfile of the matching loop saved in '{profile_file}', the top functions by cumulative time:")
+    for line in profile.report( ):
+      my_colorama.cyan(f"  {line}")
 
-        header = ['No.', 'Target', 'Significant --regex', 'Best Match Score', 'Best Match', 'Best Match Path', '2nd Match Score', '2nd Match', '2nd Match Path', '3rd Match Score', '3rd Match', '3rd Match Path']
-        listwriter.writerow(header)
+  summary = search.summary( )
+  my_colorama.blue(f"\n{summary[0]}")
+  message = search.save_cache( )
+  if message:
+    my_colorama.yellow(message)
+  for line in summary[1:]:
+    my_colorama.blue(line)
 
-        for line in csvlines:
-          listwriter.writerow(line)
-
-    return csvlines
+  return (csvlines, tree)
 
 
 # read_match_list_csv( )
@@ -206,126 +202,69 @@ def read_match_list_csv( ):
   return csvlines
 
 
-# upload_to_azure( ) - Just what the name says post-processing
+# copy_rows_to_azure(rows, tree) - The --copy-to-azure post-processing of match-list rows, which may be a
+# list or (with --pipeline) an iterator over rows still being matched.  Writes 'object_urls.csv'.
 # ----------------------------------------------------------------------------------------------
-def upload_to_azure(blob_service_client, target, score, match, upload_file_path):
+def copy_rows_to_azure(rows, tree=None):
+  if isinstance(rows, list):
+    msg = f"\n\tBeginning copy_to_azure process for {len(rows)} objects.\n\t"
+  else:
+    msg = f"\n\tBeginning copy_to_azure process for each object as soon as it is matched.\n\t"
+  my_colorama.blue(msg)
+  started = time.perf_counter( )
+  uploader = None
+
   try:
-    
-    # Check if the match score was 90 or above, if not, don't copy it!
-    if score < 90:
-      msg = f"Best match for '{target}' has an insufficient match score of {score}.  It will NOT be copied to Azure storage."
-      my_colorama.red(msg)
-      return False
-
-    # Determine which container ['objs','thumbs','smalls'] for this file
-    container_name = False
-
-    if "_TN." in match:
-      container_name = 'thumbs'   
-      url = azure_base_url + "thumbs/" + match 
-    elif "_JPG." in match:
-      container_name = 'smalls'   
-      url = azure_base_url + "smalls/" + match 
-    elif "_OBJ." in match:
-      container_name = 'objs'
-      url = azure_base_url + "objs/" + match 
-    else:
-      container_name = 'objs'
-      url = azure_base_url + "objs/" + match 
-
-
-    # Create a blob client using the local file name as the name for the blob
-    if container_name:
-      blob_client = blob_service_client.get_blob_client(container=container_name, blob=match)
-      if blob_client.exists( ):
-        msg = f"Blob '{match}' already exists in Azure Storage container '{container_name}'.  Skipping this upload."
-        my_colorama.yellow(msg)
-      else:  
-        msg = f"Uploading '{match}' to Azure Storage container '{container_name}'"
-        my_colorama.blue(msg)
-        # Upload the file
-        with open(file=upload_file_path, mode="rb") as data:
-          blob_client.upload_blob(data)
-      
-    else:  
-      msg = f"No container available for uploading '{match}' to Azure Storage!'"
-      my_colorama.red(msg)
-      return False
-
-    return url
 
-  except Exception as ex:
-    my_colorama.yellow('Exception:')
-    my_colorama.yellow(f"{ex}")
-    pass
-
-
-# extract_sheet_id_from_url(url)
-# ---------------------------------------------------------------------------------------
-def extract_sheet_id_from_url(url):
-  res = re.compile(r'#gid=([0-9]+)').search(url)
-  if res:
-    return res.group(1)
-  raise Exception('No valid sheet ID found in the specified Google Sheet.')
-
-# excel_column_number(name)     
-# from https://stackoverflow.com/questions/7261936/convert-an-excel-or-spreadsheet-column-letter-to-its-number-in-pythonic-fashion
-# ------------------------------------------------------------------------------
-def excel_column_number(name):
-  """Excel-style column name to number, e.g., A = 1, Z = 26, AA = 27, AAA = 703."""
-  n = 0
-  for c in name:
-    n = n * 26 + 1 + ord(c) - ord('A')
-  return n
-
-# check_significant(regex, filename)
-# ---------------------------------------------------------------------------------------
-def check_significant(regex, filename):
-  import re
-
-  if '(' in regex:             # regex already has a (group), do not add one
-    pattern = regex
-  else: 
-    pattern = f"({regex})"     # regex is raw, add a (group) pair of parenthesis
+    # Retrieve the connection string for use with the application. The storage
+    # connection string is stored in an environment variable on the machine
+    # running the application called AZURE_STORAGE_CONNECTION_STRING. If the environment variable is
+    # created after the application is launched in a console or with Visual Studio,
+    # the shell or application needs to be closed and reloaded to take the
+    # environment variable into account.
 
-  try:
-    match = re.search(pattern, filename) 
-    if match:
-      return match.group( )
-    else:
-      return False
-  except Exception as e:
-    assert False, f"Exception: {e}"  
+    connect_str = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
 
+    # Create the BlobServiceClient object, ONE client (and connection pool) shared by all --upload-workers
+    # and the --block-workers staging each of their large files
+    blob_service_client = my_azure.service_client(connect_str, upload_workers * block_workers)
+    manifest = my_azure.Manifest( )
 
-# build_lists_and_dict(significant, target, files_list, paths_list)
-# ---------------------------------------------------------------------------------------
-def build_lists_and_dict(significant, target, files_list, paths_list):
-  significant_file_list = []
-  significant_path_list = [] 
-  significant_match = False
-  is_significant = "*"
+    # With --extended, each target's _TN. and _JPG. files are looked up in the scanned tree, no stat( ) calls
+    siblings = my_matcher.SiblingMap(tree) if extended and tree is not None else None
+    uploader = my_azure.Uploader(blob_service_client, upload_workers, manifest=manifest, block_size=block_size_mb * 1024 * 1024,
+                                 block_workers=block_workers, max_buffer=max_buffer_mb * 1024 * 1024, siblings=siblings)
 
-  # If a --regex (significant) was specified see if our target has a matching component...
-  if significant:
-    significant_match = check_significant(significant, target)
-    if significant_match:   # ...it does, pare the significant_*_list down to only significant matches
-      for i, f in enumerate(files_list): 
-        is_significant = check_significant(significant_match, f)
-        if is_significant:
-          significant_file_list.append(f)
-          significant_path_list.append(paths_list[i])
-  
-  # If there's no significant_match... make the output lists match the input lists
-  if not significant_match:
-    significant_file_list = files_list
-    significant_path_list = paths_list 
+    # List the 'objs', 'thumbs' and 'smalls' containers once, so every "already exists?" check is local.
+    # Rows still being matched (--pipeline) are not known yet, so then the containers are listed in full.
+    with metrics.stage('azure_listing'):
+      listing = uploader.prefetch(rows if isinstance(rows, list) else None, extended)
+    if listing is not None:
+      my_colorama.blue(f"\tListed {sum(len(blobs) for blobs in listing.values( ))} existing blobs in {uploader.counts['remote_calls']} remote call(s).")
 
-  # Now, per https://github.com/seatgeek/fuzzywuzzy/issues/165 build an indexed dict of significant files
-  file_dict = {idx: el for idx, el in enumerate(significant_file_list)}
+    # Open a CSV file to accept `object_location`, `image_small`, and 
+    # `image_thumb` columns of Azure URLs.
+    urls_for_csv = open("object_urls.csv", "w")
+    csv_handler = csv.writer(urls_for_csv)
+
+    # Loop on all the "matches", --upload-workers at a time.  Each row's set of 3 Azure URLs, some may
+    # be blank, comes back in the original order and is written to our CSV file.
+    for urls in uploader.copy_rows(rows, extended):
+      csv_handler.writerow(urls)
 
-  # Return a tuple of significant match and the three significant lists
-  return (significant_match, significant_file_list, significant_path_list, file_dict)    
+    urls_for_csv.close( )
+    manifest.save( )
+    counts = uploader.counts
+    my_colorama.blue(f"\n\t{counts['uploaded']} files uploaded, {counts['skipped']} already in storage, {counts['failed']} failed, {counts['remote_calls']} remote calls in all.")
+
+  except Exception as ex:
+    my_colorama.red('Exception:')
+    my_colorama.red(f"{ex}")
+
+  metrics.add('azure', time.perf_counter( ) - started)
+  if uploader:
+    for what in ('uploaded', 'skipped', 'failed', 'remote_calls', 'bytes'):
+      metrics.set(f"azure_{what}", uploader.counts[what])
 
 
 # --- Main
@@ -340,28 +279,37 @@ if __name__ == '__main__':
 
   args = sys.argv[1:]
   output_to_csv = False
+  path = False
 
   try:
-    opts, args = getopt.getopt(args, 'haokmxgw:c:t:r:s:', ["help", "copy-to-azure", "output-csv", "kept-file-list", "extended", "grinnell", "use-match-list", "worksheet=", "column=", "tree-path=", "regex=", "skip-rows="])
+    opts, args = getopt.getopt(args, 'haokmxgw:c:t:r:s:', ["help", "copy-to-azure", "output-csv", "kept-file-list", "extended", "grinnell", "use-match-list", "resume", "worksheet=", "column=", "tree-path=", "regex=", "skip-rows=", "walk-workers=", "engine=", "shortlist=", "min-shortlist=", "workers=", "match-cache=", "write-back=", "upload-workers=", "block-size=", "block-workers=", "max-buffer=", "pipeline", "queue-rows=", "metrics=", "profile="])
   except getopt.GetoptError:
-    my_colorama.yellow("python3 network-file-finder.py --help --copy-to-azure --output-csv --kept-file-list --extended --grinnell --use-match-list --worksheet <worksheet URL> --column <worksheet filename column> --tree-path <network tree path> --regex <significant regex> \n")
+    my_colorama.yellow("python3 network-file-finder.py --help --copy-to-azure --output-csv --kept-file-list --extended --grinnell --use-match-list --resume --worksheet <worksheet URL> --column <worksheet filename column> --tree-path <network tree path> --regex <significant regex> --walk-workers <concurrent directory listings> --engine <auto|rapidfuzz|fuzzywuzzy> --shortlist <files per target> --min-shortlist <full scan below this> --workers <matching processes> --match-cache <results kept, 0 = off> --write-back <first result column> --upload-workers <concurrent uploads> --block-size <MB> --block-workers <blocks per file> --max-buffer <MB> --pipeline --queue-rows <rows waiting for upload> --metrics <metrics JSON file> --profile <cProfile stats file> \n")
     sys.exit(2)
 
   # Process the command line arguments
   for opt, arg in opts:
     if opt in ("-h", "--help"):
-      my_colorama.yellow("python3 network-file-finder.py --help --output-csv --kept-file-list --worksheet <worksheet URL> --column <filename column> --tree-path <network tree path> --regex <significant regex> --skip-rows <number of header rows to skip> --copy-to-azure --extended --grinnell --use-match-list\n")
+      my_colorama.yellow("python3 network-file-finder.py --help --output-csv --kept-file-list --worksheet <worksheet URL> --column <filename column> --tree-path <network tree path> --regex <significant regex> --skip-rows <number of header rows to skip> --copy-to-azure --extended --grinnell --use-match-list --resume --walk-workers <concurrent directory listings> --engine <auto|rapidfuzz|fuzzywuzzy> --shortlist <files per target> --min-shortlist <full scan below this> --workers <matching processes> --match-cache <results kept, 0 = off> --write-back <first result column> --upload-workers <concurrent uploads> --block-size <MB> --block-workers <blocks per file> --max-buffer <MB> --pipeline --queue-rows <rows waiting for upload> --metrics <metrics JSON file> --profile <cProfile stats file>\n")
       sys.exit( )
     elif opt in ("-w", "--worksheet"):
       sheet = arg
     elif opt in ("-c", "--column"):
-      if arg.isalpha() and arg.isupper():
-        column = excel_column_number(arg)
-      else:
-        my_colorama.red("Unhandled option: Column must be an uppercase character or string using only letters A through Z.")
+      column = my_sheets.column_number(arg)
+      if not column:
+        my_colorama.red("Unhandled option: Column must be a character or string using only letters A through Z.")
+        exit( )
+    elif opt == "--write-back":
+      write_back_column = my_sheets.column_number(arg)
+      if not write_back_column:
+        my_colorama.red("Unhandled option: Write-back column must be a character or string using only letters A through Z.")
         exit( )
     elif opt in ("-t", "--tree-path"):
       path = arg
+    elif opt == "--metrics":
+      metrics_file = arg
+    elif opt == "--profile":
+      profile_file = arg
     elif opt in ("-r", "--regex"):
       significant = arg
     elif opt in ("-s", "--skip-rows"):
@@ -375,6 +323,52 @@ if __name__ == '__main__':
       except ValueError:
         my_colorama.red("Unhandled option: Number of rows to skip must be an integer >= 0")
         exit( )
+    elif opt in ("--walk-workers", "--workers", "--upload-workers", "--block-size", "--block-workers", "--max-buffer", "--queue-rows"):
+      try:
+        val = int(arg)
+        if val >= 1:
+          if opt == "--walk-workers":
+            walk_workers = val
+          elif opt == "--workers":
+            match_workers = val
+          elif opt == "--upload-workers":
+            upload_workers = val
+          elif opt == "--block-size":
+            block_size_mb = val
+          elif opt == "--block-workers":
+            block_workers = val
+          elif opt == "--queue-rows":
+            queue_rows = val
+          else:
+            max_buffer_mb = val
+        else:
+          my_colorama.red(f"Unhandled option: {opt} must be an integer >= 1.")
+          exit( )
+      except ValueError:
+        my_colorama.red(f"Unhandled option: {opt} must be an integer >= 1")
+        exit( )
+    elif opt == "--engine":
+      if arg in ('auto', *my_matcher.engines):
+        engine_name = arg
+      else:
+        my_colorama.red(f"Unhandled option: Engine must be one of: auto, {', '.join(my_matcher.engines)}.")
+        exit( )
+    elif opt in ("--shortlist", "--min-shortlist", "--match-cache"):
+      try:
+        val = int(arg)
+        if val >= 0:
+          if opt == "--shortlist":
+            shortlist_size = val
+          elif opt == "--min-shortlist":
+            min_shortlist = val
+          else:
+            match_cache_size = val
+        else:
+          my_colorama.red(f"Unhandled option: {opt} must be an integer >= 0.")
+          exit( )
+      except ValueError:
+        my_colorama.red(f"Unhandled option: {opt} must be an integer >= 0")
+        exit( )
     elif opt in ("-o", "--output-csv"):
       output_to_csv = True
     elif opt in ("-a", "--copy-to-azure"):
@@ -383,6 +377,10 @@ if __name__ == '__main__':
       kept_file_list = True
     elif opt in ("-m", "--use-match-list"):
       use_match_list = True
+    elif opt == "--resume":
+      resume = True
+    elif opt == "--pipeline":
+      pipelined = True
     elif opt in ("-x", "--extended"):
       extended = True
     elif opt in ("-g", "--grinnell"):
@@ -409,84 +407,51 @@ if __name__ == '__main__':
   if use_match_list:
     csvlines = read_match_list_csv( )
 
+    # --extended looks for _TN. and _JPG. files in the --tree-path, when there is one
+    if copy_to_azure and extended and path:
+      (tree_index, tree) = my_tree.load_tree(path, walk_workers)
+
   # Not using the match-list.csv results... call the BIG function!
   else:
-    csvlines = BIG_function(kept_file_list, path, counter)    
-
-## Post-processing...
-## ------------------------------------------------------------------------------------------
-
-# If --copy-to-azure is true... for each '_OBJ.' (and if --extended '_TN.' or '_JPG.') match 
-# execute a copy to Azure Blob Storage operation.  For this to work our AZURE_STORAGE_CONNECTION_STRING
-# environment variable must be in place and accurate.  
-#
-if copy_to_azure:
-  msg = f"\n\tBeginning copy_to_azure process for {len(csvlines)} objects.\n\t"
-  my_colorama.blue(msg)
-
-  try:
-
-    # Retrieve the connection string for use with the application. The storage
-    # connection string is stored in an environment variable on the machine
-    # running the application called AZURE_STORAGE_CONNECTION_STRING. If the environment variable is
-    # created after the application is launched in a console or with Visual Studio,
-    # the shell or application needs to be closed and reloaded to take the
-    # environment variable into account.
-
-    connect_str = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-
-    # Create the BlobServiceClient object
-    blob_service_client = BlobServiceClient.from_connection_string(connect_str)
-
-    # Open a CSV file to accept `object_location`, `image_small`, and 
-    # `image_thumb` columns of Azure URLs.
-    urls_for_csv = open("object_urls.csv", "w")
-    csv_handler = csv.writer(urls_for_csv)
-
-    # Loop on all the "matches"
-    for line in csvlines:
-      # print(line)
-      index = int(line[0])
-      target = line[1]
-      score = int(line[3])
-      match = line[4]
-      path = line[5]
-
-      # Build a network file path for the best match
-      upload_file_path = os.path.join(path, match)
-
-      # Do it and return an Azure Blob URL for the object
-      url = upload_to_azure(blob_service_client, target, score, match, upload_file_path)
-
-      tn_url = False
-      jpg_url = False
-      urls = ["", "", ""]
-
-      # If --extended is on... try again for a _TN. file and _JPG. file
-      if extended:
-        
-        tn = target.replace("_OBJ.", "_TN.jpg")
-        upload_file_path = os.path.join(path, tn)
-        if os.path.isfile(upload_file_path):
-          tn_url = upload_to_azure(blob_service_client, tn, 100, tn, upload_file_path)
-
-        jpg = target.replace("_OBJ.", "_JPG.jpg")
-        upload_file_path = os.path.join(path, jpg)
-        if os.path.isfile(upload_file_path):
-          jpg_url = upload_to_azure(blob_service_client, jpg, 100, jpg, upload_file_path)
-
-      # Build a set of 3 Azure URLs, some may be blank, and write them to our CSV file.
-      if url:
-        urls[0] = url
-      if jpg_url:
-        urls[1] = jpg_url  
-      if tn_url:
-        urls[2] = tn_url  
-
-      csv_handler.writerow(urls)
-
-
-  except Exception as ex:
-    my_colorama.red('Exception:')
-    my_colorama.red(f"{ex}")
-
+    # With --pipeline (and --copy-to-azure) matched rows flow straight on to the uploader, otherwise all
+    # of the uploading waits for post-processing
+    if pipelined and copy_to_azure:
+      pipeline = my_pipeline.RowPipeline(copy_rows_to_azure, queue_rows)
+    (csvlines, tree) = BIG_function(kept_file_list, path, counter, pipeline)    
+    if pipeline:
+      pipeline.close( )
+      for line in pipeline.report( ):
+        my_colorama.blue(f"\t{line}")
+
+  # If --write-back, put the best match score, match and path of every row back into the --worksheet
+  if write_back_column:
+    try:
+      with metrics.stage('write_back'):
+        worksheet = sheets.worksheet(sheet, gid=my_sheets.extract_sheet_id_from_url(sheet))
+        calls = my_sheets.write_back(worksheet, csvlines, write_back_column, skip_rows)
+      my_colorama.green(f"\nWrote {len(csvlines)} best matches back to the worksheet in {calls} API call(s).")
+    except Exception as e:
+      my_colorama.red(f"Unable to write the matches back to the worksheet: {e}")
+
+  ## Post-processing...
+  ## ------------------------------------------------------------------------------------------
+
+  # If --copy-to-azure is true... for each '_OBJ.' (and if --extended '_TN.' or '_JPG.') match 
+  # execute a copy to Azure Blob Storage operation.  For this to work our AZURE_STORAGE_CONNECTION_STRING
+  # environment variable must be in place and accurate.  With --pipeline this already happened, row by row,
+  # while the matching was still running.
+  #
+  if copy_to_azure and pipeline is None:
+    copy_rows_to_azure(csvlines, tree)
+
+  # Where did the time go?  Summarize the run's stage times and counts, and with --metrics save them as JSON
+  metrics.finish( )
+  my_colorama.cyan("\nMetrics:")
+  for line in metrics.report( ):
+    my_colorama.cyan(f"\t{line}")
+  if metrics_file:
+    try:
+      metrics.save(metrics_file)
+      my_colorama.cyan(f"\tMetrics saved in '{metrics_file}'.")
+    except OSError as e:
+      my_colorama.yellow(f"Unable to save the metrics in '{metrics_file}': {e}")
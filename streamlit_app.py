@@ -20,10 +20,15 @@
 import os
 import streamlit as st
 import json
-import gspread as gs
 import re
-import csv
-from fuzzywuzzy import process
+
+# Local packages
+import my_tree
+import my_matcher
+import my_results
+import my_sheets
+import my_engine
+import my_metrics
 
 # Globals
 
@@ -39,8 +44,16 @@ grinnell = False
 use_match_list = False
 counter = 0
 csvlines = [ ]
-big_file_list = [ ]   # need a list of just filenames...
-big_path_list = [ ]   # ...and parallel list of just the paths
+checkpoint_rows = 100                     # Rows matched (and checkpointed) per batch, a cancel waits for the batch under way
+match_cache_size = 100000                 # Match results remembered between searches
+tree_cache_ttl = 15 * 60                  # Seconds before a cached tree snapshot is refreshed
+tree_cache_bytes = 1024 * 1024 * 1024     # Memory bound for ALL cached tree snapshots
+sheet_cache_ttl = 10 * 60                 # Seconds before cached Google Sheets metadata is fetched again
+progress_interval = 0.5                   # Seconds between polls of a running search's progress and results
+search_job_workers = 1                    # Searches run at once, shared by all sessions, others wait in line
+search_jobs_kept = 20                     # Finished search jobs kept for their results
+profile_file = 'search.prof'              # cProfile stats of a search's matching loop, when profiling is checked
+results_page_rows = 100                   # Rows per page of the results table
 significant_file_list = [ ]
 significant_path_list = [ ] 
 significant_dict = { }
@@ -87,217 +100,188 @@ def st_file_selector(st_placeholder, path, label='Select a file/folder', key='di
 # ---------------------------------------------------------------------
 
 
-# check_significant(regex, filename)
-# ---------------------------------------------------------------------------------------
-def check_significant(regex, filename):
-    import re
-
-    if '(' in regex:             # regex already has a (group), do not add one
-        pattern = regex
-    else: 
-        pattern = f"({regex})"     # regex is raw, add a (group) pair of parenthesis
-
-    try:
-        match = re.search(pattern, filename) 
-        if match:
-            return match.group( )
-        else:
-            return False
-    except Exception as e:
-        assert False, f"Exception: {e}"  
-
-
-# build_lists_and_dict(significant, target, files_list, paths_list)
-# ---------------------------------------------------------------------------------------
-def build_lists_and_dict(significant, target, files_list, paths_list):
-    significant_file_list = []
-    significant_path_list = [] 
-    significant_match = False
-    is_significant = "*"
-
-    # If a --regex (significant) was specified see if our target has a matching component...
-    if significant:
-        significant_match = check_significant(significant, target)
-        if significant_match:   # ...it does, pare the significant_*_list down to only significant matches
-            for i, f in enumerate(files_list): 
-                is_significant = check_significant(significant_match, f)
-            if is_significant:
-                significant_file_list.append(f)
-                significant_path_list.append(paths_list[i])
-  
-    # If there's no significant_match... make the output lists match the input lists
-    if not significant_match:
-        significant_file_list = files_list
-        significant_path_list = paths_list 
-
-    # Now, per https://github.com/seatgeek/fuzzywuzzy/issues/165 build an indexed dict of significant files
-    file_dict = {idx: el for idx, el in enumerate(significant_file_list)}
-
-    # Return a tuple of significant match and the three significant lists
-    return (significant_match, significant_file_list, significant_path_list, file_dict)    
-
-
-# fuzzy-search-for-files(status)
-# All parameters come from st.session_state...
+# search_settings( ) - The search parameters from st.session_state, collected in the script thread for a job
 # --------------------------------------------------------------------------------------
-def fuzzy_search_for_files(status ):
-
-    # Get st.session_state parameters
-    kept_file_list = state('use_previous_file_list')
-    sheet_url = state('google_sheet_url')
-    worksheet_title = state('google_worksheet_selection')
-    column = state('worksheet_column_number')
-    path = state('stfs_path_selection')
-    regex = state('regex_text')
-
-    csvlines = [ ]
-    counter = 0
-    filenames = [ ]
+def search_settings( ):
+    return {'kept_file_list': state('use_previous_file_list'),
+            'sheet_url': state('google_sheet_url'),
+            'worksheet_title': state('google_worksheet_selection'),
+            'column': state('worksheet_column_number'),
+            'path': state('stfs_path_selection'),
+            'regex': state('regex_text') or False,
+            'walk_workers': state('walk_workers') or 1,
+            'engine_name': state('engine_name') or 'auto',
+            'shortlist_size': state('shortlist_size') or 0,
+            'min_shortlist': state('min_shortlist') or 0,
+            'match_workers': state('match_workers') or 1,
+            'match_cache_size': match_cache_size if state('use_match_cache') else 0,
+            'resume': state('resume_search'),
+            'output_to_csv': state('output_to_csv'),
+            'write_back_column': state('write_back_column'),
+            'profile': state('profile_search')}
+
+
+# fuzzy-search-for-files(job, settings, trees, sheets)
+# The search itself, run as a background my_engine.Job.  All parameters come from search_settings( ), and
+# it must NOT call Streamlit: messages go to job.note( ), rows to job.follow( ) and stage times and counts
+# to job.metrics for the UI to poll.
+# --------------------------------------------------------------------------------------
+def fuzzy_search_for_files(job, settings, trees, sheets):
+    metrics = job.metrics
 
     # Check the --kept-file-list switch.  If it is True then attempt to open the `file-list.tmp`` file 
     # saved from a previous run.  The intent is to cut-down on Google API calls.
-    if kept_file_list:
+    filenames = [ ]
+    if settings['kept_file_list']:
         try:
-            with open('file-list.tmp', 'r') as file_list:
-                for filename in file_list:
-                    if filename:
-                        filenames.append(filename.strip( ))
-                    else: 
-                        filenames.append("")
-
+            filenames = my_engine.read_file_list( )
         except Exception as e:
-            kept_file_list = False
             pass  
 
-    # If we aren't using a kept file list... Open the Google service account and sheet
+    # If we aren't using a kept file list... Open the specified worksheet (tab) through the sheet cache,
+    # the client and spreadsheet opened for the worksheet selection are re-used
     else:
-
-        try:
-            sa = gs.service_account()
-        except Exception as e:
-            st.exception(e)
+        with metrics.stage('sheets'):
+            worksheet = sheets.worksheet(settings['sheet_url'], settings['worksheet_title'])
     
-        try:
-            sh = sa.open_by_url(sheet_url)
-        except Exception as e:
-            st.exception(e)
-
-        # Open the specified worksheet (tab)
-        worksheet = sh.worksheet(worksheet_title)
-    
-        # Grab all filenames from --column 
-        filenames = worksheet.col_values(column)  
-        
-        # Save the filename list in 'file-list.tmp' for later
-        try:
-            with open('file-list.tmp', 'w') as file_list:
-                for filename in filenames:
-                    file_list.write(f"{filename}\n")
-        except Exception as e:
-            st.exception(e)
-            exit( )
-
-    # Grab all non-hidden filenames from the target directory tree so we only have to get the list once
-    # Exclusion of dot files per https://stackoverflow.com/questions/13454164/os-walk-without-hidden-folders
-
-    for root, dirs, files in os.walk(path):
-        files = [f for f in files if not f[0] == '.']
-        dirs[:] = [d for d in dirs if not d[0] == '.']
-        for filename in files:
-            big_path_list.append(root)
-            big_file_list.append(filename)
-
-    # Check for ZERO network files in the big_file_list
-    if len(big_file_list) == 0:
-        st.error(f"The specified --tree-path of '{path}' returned NO files!  Check your path specification and network connection!\n")
-        exit( )
-
-    # # Report our --regex option...
-    # if significant:
-    #   my_colorama.green(f"\nProcessing only files matching signifcant --regex of '{significant}'!")
-    # else:
-    #   my_colorama.green(f"\nNo --regex specified, matching will consider ALL paths and files.")
-
-    # Now the main matching loop...
-    for x in range(len(filenames)):
-        if x < skip_rows:  # skip this row if instructed to do so 
-            st.warning(f"Skipping match for '{filenames[x]}' in worksheet row {x}")
-            continue         # move on and process the next row
-    
-        counter += 1
-        target = filenames[x]
-    
-        # # If --grinnell is specified and the 'target' begins with 'grinnell_' AND does not contain '_OBJ'... make it so
-        # if grinnell and ('grinnell_' in target) and ('_OBJ' not in target):
-        #     target += '_OBJ.'
-
-        status.update(label=f"{counter}. Finding best fuzzy filename matches for '{target}'...", expanded=True, state="running")
-        # st.write(f"{counter}. Finding best fuzzy filename matches for '{target}'...")
-        csv_line = [ ]  
-        significant_text = ''
-
-        (significant_text, significant_file_list, significant_path_list, significant_dict) = build_lists_and_dict(significant, target, big_file_list, big_path_list)    
-
-        report = "None"
-        # if significant_text:
-        #     st.status(f"  Significant string is: '{significant_text}'.")
-        #     report = significant_text
-
-        # If target is blank, skip the search and set matches = False
-        matches = False
-        if len(target) > 0:
-            matches = process.extract(target, significant_dict, limit=3)
-
-        # Append new line to CSV regardless if there was a match or not
-        csv_line.append(f"{counter}")
-        csv_line.append(target)
-        csv_line.append(report)
-
-        # Report the top three matches
-        if matches:
-            for found, (match, score, index) in enumerate(matches):
-                path = significant_path_list[index]
-                csv_line.append(f"{score}")
-                csv_line.append(match)
-                csv_line.append(path)
-                if found==0: 
-                    # txt = ' | '.join(csv_line)
-                    st.success(f"!!! Found BEST matching file: {format(csv_line)}")
+            # Grab all filenames from --column, and save them in 'file-list.tmp' for later
+            filenames = worksheet.col_values(settings['column'])  
+        my_engine.save_file_list(filenames)
+
+    # Grab all non-hidden filenames from the target directory tree.  Snapshots are shared by every session
+    # through the tree cache, and refreshed via the persistent tree index once they are too old.
+    path = settings['path']
+    with metrics.stage('tree_walk'):
+        (tree, hit) = trees.get(path, settings['walk_workers'])
+    metrics.set('files_scanned', len(tree))
+    metrics.set('tree_cache_hit', hit)
+    job.note('info', f"{'Cached' if hit else 'Fresh'} tree snapshot of '{path}' with {len(tree)} files.")
+
+    # Check for ZERO network files in the tree
+    if len(tree.names) == 0:
+        raise Exception(f"The specified --tree-path of '{path}' returned NO files!  Check your path specification and network connection!")
+
+    # Collect the targets...
+    (targets, skipped) = my_engine.build_targets(filenames, skip_rows, grinnell)
+    for (x, filename) in skipped:
+        job.note('warning', f"Skipping match for '{filename}' in worksheet row {x}")
+
+    # The engine, match cache, stem / regex / trigram indexes and checkpoint for the whole search
+    search = my_engine.Search(tree, targets, settings['regex'], settings['engine_name'], settings['shortlist_size'],
+                              settings['min_shortlist'], settings['match_workers'], settings['match_cache_size'],
+                              settings['resume'], grinnell, skip_rows, checkpoint_rows, settings['output_to_csv'], metrics)
+    if settings['resume']:
+        job.note('info', f"Resuming: {len(search.done)} of {len(targets)} rows are already finished.")
+    job.note('info', f"Finding best fuzzy filename matches for {len(targets) - len(search.done)} targets using the '{search.engine.name}' engine...")
+
+    # Now the main matching loop, the job keeps every row the search yields until it ends or is cancelled
+    # (after the batch under way).
+    # With profiling checked, the loop runs under cProfile.
+    with my_metrics.profiled(profile_file if settings['profile'] else None) as profile:
+        job.follow(search)
+    if profile:
+        job.note('info', f"Profile of the matching loop saved in '{profile_file}', the top functions by cumulative time:")
+        job.note('code', '\n'.join(profile.report( )))
+
+    message = search.save_cache( )
+    if message:
+        job.note('warning', message)
+    for line in search.summary( ):
+        job.note('info', line)
+    if settings['output_to_csv']:
+        job.note('success', f"**Fuzzy search output is saved in 'match-list.csv'**")
+
+
+# search_jobs( ) - The one my_engine.Jobs executor shared by every session, searches run one at a time
+# -------------------------------------------------------------------------------
+@st.cache_resource
+def search_jobs( ):
+    return my_engine.Jobs(search_job_workers, search_jobs_kept)
 
-        else:
-            csv_line.append('0')
-            csv_line.append('NO match')
-            csv_line.append('NO match')
-            st.warning(f"*** Found NO match for: {format(' | '.join(csv_line))}")
 
-        # Save this fuzzy search result in 'csvlines' for return
-        csvlines.append(csv_line)
+# show_job_progress(job_id) - Progress, messages and latest rows of a running search job, re-run every
+# progress_interval seconds as an st.fragment, so polling does not re-run the whole app
+# -------------------------------------------------------------------------------
+def show_job_progress(job_id):
+    job = search_jobs( ).get(job_id)
+    if job is None or job.finished:
+        st.rerun( )   # the whole app shows the finished job
+
+    st.caption(f"Search job {job.id} is {job.state}.")
+    for (kind, text) in job.messages:
+        getattr(st, kind)(text)
+    if job.progress:
+        st.progress(job.progress.fraction( ), text=job.progress.text( ))
+        st.dataframe(results_frame(job.rows[-results_page_rows:]), hide_index=True, use_container_width=True)
+    if job.cancelled.is_set( ):
+        st.warning("Cancelling the search...")
+    elif st.button("Cancel the search", key='cancel_search_button'):
+        job.cancel( )
+
+
+# show_job_results(job) - Messages and paged results of a finished search job
+# -------------------------------------------------------------------------------
+def show_job_results(job):
+    for (kind, text) in job.messages:
+        getattr(st, kind)(text)
+    if job.state == 'failed':
+        st.exception(job.error)
+    elif job.state == 'cancelled':
+        st.warning(f"Search job {job.id} was cancelled after {len(job.rows)} rows, check 'resume' to pick it up from there.")
+    else:
+        st.success(f"Search job {job.id} is **complete**, {len(job.rows)} rows in {job.finished - job.submitted:.1f}s.")
+    if job.rows:
+        show_results(job.rows)
 
-        # If --output-csv is true, open a .csv file to receive the matching filenames and add a heading
-        if state('output_to_csv'):
-            with open('match-list.csv', 'w', newline='') as csvfile:
-                list_writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
 
-                if state('significant'):
-                    significant_header = f"\'{state('significant')}\' Match"
-                else:  
-                    significant_header = "Undefined"
+# results_frame(csvlines) - match-list.csv rows as {column: values} for st.dataframe( )
+# -------------------------------------------------------------------------------
+def results_frame(csvlines):
+    return {name: [line[n] if n < len(line) else '' for line in csvlines] for n, name in enumerate(my_results.header)}
 
-                header = ['No.', 'Target', 'Significant --regex', 'Best Match Score', 'Best Match', 'Best Match Path', '2nd Match Score', '2nd Match', '2nd Match Path', '3rd Match Score', '3rd Match', '3rd Match Path']
-                list_writer.writerow(header)
 
-                for line in csvlines:
-                    list_writer.writerow(line)
+# show_results(csvlines) - One page of the search results, the page picked with a number input
+# -------------------------------------------------------------------------------
+def show_results(csvlines):
+    pages = max(1, -(-len(csvlines) // results_page_rows))
+    page = st.number_input(label=f"Results page (of {pages})", min_value=1, max_value=pages, value=1, key='results_page_input')
+    start = (page - 1) * results_page_rows
+    st.dataframe(results_frame(csvlines[start:start + results_page_rows]), hide_index=True, use_container_width=True)
+    st.caption(f"Rows {start + 1} to {min(start + results_page_rows, len(csvlines))} of {len(csvlines)}")
 
-    st.success(f"**Fuzzy search output is saved in 'match-list.csv**")
-    status.update(label=f"Fuzzy search is **complete**!", expanded=True, state="complete")
 
-    return csvlines
+# tree_cache( ) - The one TreeCache shared by every session of this Streamlit server
+# -------------------------------------------------------------------------------
+@st.cache_resource
+def tree_cache( ):
+    return my_tree.TreeCache(tree_cache_ttl, tree_cache_bytes)
 
 
+# write_back_results(csvlines, settings) - Put the best match columns of `csvlines` back into the worksheet the
+# search ran on.  `settings` are the job's own search_settings( ), not whatever is selected by the time it finishes.
+# -------------------------------------------------------------------------------
+def write_back_results(csvlines, settings):
+    first_column = my_sheets.column_number(settings['write_back_column'])
+    if not first_column:
+        st.error(f"'{settings['write_back_column']}' is not a valid column, results were NOT written back to the worksheet.")
+        return
+    if not (settings['sheet_url'] and settings['worksheet_title']):
+        st.error("Select a Google Sheet and worksheet to write results back into.")
+        return
 
+    try:
+        worksheet = sheet_cache( ).worksheet(settings['sheet_url'], settings['worksheet_title'])
+        calls = my_sheets.write_back(worksheet, csvlines, first_column, skip_rows)
+        st.success(f"Wrote {len(csvlines)} best matches back to worksheet '{settings['worksheet_title']}' starting at column {n2a(first_column - 1)} in {calls} API call(s).")
+    except Exception as e:
+        st.exception(e)
 
 
+# sheet_cache( ) - The one SheetCache (gspread client, spreadsheets, worksheet lists and headers) shared by every session
+# -------------------------------------------------------------------------------
+@st.cache_resource
+def sheet_cache( ):
+    return my_sheets.SheetCache(sheet_cache_ttl)
 
 
 # n2a(n) - Convert spreadsheet column position (n) to a letter designation per
@@ -378,34 +362,29 @@ def get_worksheet_column_selection( ):
 
             selected_worksheet = state("google_worksheet_selection")
 
-            # Open the Google service account 
-            try:
-                sa = gs.service_account( )
-            except Exception as e:
-                st.error(e)
-    
-            # Open the sheet
+            # Fetch list of worksheets and build a name:gid dict.  The sheet_cache( ) only calls the Google API
+            # when this sheet has not been opened recently, not on every rerun.
             try:
-                sh = sa.open_by_url(sheet_url)
+                worksheet_list = sheet_cache( ).worksheets(sheet_url)
             except Exception as e:
                 st.error(e)
-
-            # Fetch list of worksheets and build a name:gid dict 
-            worksheet_list = sh.worksheets( )
+                worksheet_list = [ ]
             worksheet_dict = { }
             worksheet_dict = transform_list_to_dict(worksheet_dict, worksheet_list)
     
-            # Select the worksheet to be processed
-            selected_worksheet = st.selectbox('Choose the worksheet you wish to work with', worksheet_dict.keys( ), index=None, key='worksheet_selectbox')   
+            # Select the worksheet to be processed, starting with the one the sheet's URL names by '#gid=' (if any)
+            try:
+                gid = str(my_sheets.extract_sheet_id_from_url(sheet_url))
+                url_worksheet = list(worksheet_dict.values( )).index(gid)
+            except ValueError:
+                url_worksheet = None
+            selected_worksheet = st.selectbox('Choose the worksheet you wish to work with', worksheet_dict.keys( ), index=url_worksheet, key='worksheet_selectbox')   
             st.session_state.google_worksheet_selection = selected_worksheet
 
             if state("google_worksheet_selection"):
                 st.success(f"Selected worksheet: '{selected_worksheet}' with gid={worksheet_dict[selected_worksheet]}")
-                # Open the selected worksheet
-                worksheet = sh.worksheet(state("google_worksheet_selection"))
-
-                # Now fetch a list of columns from the selected sheet
-                column_list = worksheet.row_values(1)
+                # Now fetch a list of columns from the selected worksheet
+                column_list = sheet_cache( ).header(sheet_url, state("google_worksheet_selection"))
 
                 selected_column = st.selectbox('Choose the column containing your filenames', column_list, index=None, key='column_selector')   
                 st.session_state.worksheet_column_selection = selected_column
@@ -447,6 +426,24 @@ if __name__ == '__main__':
         st.session_state.regex_text = False
     if not state('output_to_csv'):
         st.session_state.output_to_csv = False
+    if not state('walk_workers'):
+        st.session_state.walk_workers = 1
+    if not state('engine_name'):
+        st.session_state.engine_name = 'auto'
+    if not state('shortlist_size'):
+        st.session_state.shortlist_size = 0
+    if not state('min_shortlist'):
+        st.session_state.min_shortlist = 50
+    if not state('match_workers'):
+        st.session_state.match_workers = 1
+    if not state('resume_search'):
+        st.session_state.resume_search = False
+    if not state('profile_search'):
+        st.session_state.profile_search = False
+    if 'use_match_cache' not in st.session_state:
+        st.session_state.use_match_cache = True
+    if not state('write_back_column'):
+        st.session_state.write_back_column = False
 
     # Display and fetch options in the sidebar
     with st.sidebar:
@@ -457,9 +454,48 @@ if __name__ == '__main__':
         output_to_csv = st.checkbox(label="Check here to output results to a CSV file", value=False, key='output_to_csv_checkbox')
         st.session_state.output_to_csv = output_to_csv
 
+        resume_search = st.checkbox(label="Check here to resume an interrupted search, re-using the rows it already finished", value=False, key='resume_search_checkbox')
+        st.session_state.resume_search = resume_search
+
+        write_back_column = st.text_input(label="Column letter(s) to write the best match score, match and path back into the worksheet (blank = no write-back)", value=None, key='write_back_column_input')
+        st.session_state.write_back_column = write_back_column
+
+        profile_search = st.checkbox(label=f"Check here to profile the matching loop with cProfile (saved in '{profile_file}')", value=False, key='profile_search_checkbox')
+        st.session_state.profile_search = profile_search
+
+        use_match_cache = st.checkbox(label="Check here to re-use match results from earlier searches of this same tree", value=True, key='use_match_cache_checkbox')
+        st.session_state.use_match_cache = use_match_cache
+
         regex_text = st.text_input(label="Specify a 'regex' pattern here to limit the scope of your search", value=None, key='regex_text_input')
         st.session_state.regex_text = regex_text
 
+        walk_workers = st.number_input(label="Number of directories to list concurrently (raise this for network mounts)", min_value=1, max_value=64, value=1, key='walk_workers_input')
+        st.session_state.walk_workers = walk_workers
+
+        engine_name = st.selectbox(label="Fuzzy matching engine ('auto' picks the fastest one installed)", options=['auto', *my_matcher.engines], index=0, key='engine_name_selectbox')
+        st.session_state.engine_name = engine_name
+
+        shortlist_size = st.number_input(label="Files shortlisted per target by trigram overlap (0 scores ALL files)", min_value=0, value=0, step=500, key='shortlist_size_input')
+        st.session_state.shortlist_size = shortlist_size
+
+        min_shortlist = st.number_input(label="Fall back to scoring ALL files when a shortlist has fewer files than this", min_value=0, value=50, key='min_shortlist_input')
+        st.session_state.min_shortlist = min_shortlist
+
+        match_workers = st.number_input(label="Number of worker processes matching worksheet rows", min_value=1, max_value=os.cpu_count( ) or 1, value=1, key='match_workers_input')
+        st.session_state.match_workers = match_workers
+
+        # Cached tree snapshots are shared by all sessions, this forces a fresh one for the selected path
+        (snapshots, snapshot_bytes) = tree_cache( ).stats( )
+        st.caption(f"{snapshots} cached tree snapshot(s) using about {snapshot_bytes // (1024 * 1024)} MB")
+        if st.button("Refresh tree", key='refresh_tree_button', help="Discard the cached snapshot of the selected directory tree"):
+            tree_cache( ).invalidate(state('stfs_path_selection') or None)
+            st.success(f"Tree snapshot of '{state('stfs_path_selection') or 'ALL paths'}' will be refreshed on the next search.")
+
+        # Google Sheets metadata is cached too, this re-reads the selected sheet's worksheets and headers
+        if st.button("Refresh sheet", key='refresh_sheet_button', help="Fetch the selected Google Sheet's worksheets and column headers again"):
+            sheet_cache( ).invalidate(state('google_sheet_url') or None)
+            st.success(f"Google Sheet '{state('google_sheet_selection') or 'ALL sheets'}' will be fetched again.")
+
 
     # Fetch the --worksheet argument
     if not state('use_previous_file_list'):
@@ -490,13 +526,29 @@ if __name__ == '__main__':
         st.write(f"Session state dump follows...")
         st.session_state
 
-    # Ready... prompt for button press to run the search
+    # Ready... prompt for button press to submit the search.  It runs as a background job, identified by the
+    # job ID in the session_state, so reruns (any widget click) neither stop it nor lose its results.
+    job = search_jobs( ).get(state('search_job')) if state('search_job') else None
     if go1 or go2:
-        if st.button("Click HERE to run the search!", key='initiate_search_button'):
-            with st.status(f"Go! {msg}") as status:
-                csv_results = fuzzy_search_for_files(status)
-
-
-
-
-
+        if st.button("Click HERE to run the search!", key='initiate_search_button', disabled=bool(job and not job.finished)):
+            settings = search_settings( )
+            job = search_jobs( ).submit(fuzzy_search_for_files, settings, tree_cache( ), sheet_cache( ))
+            job.settings = settings
+            st.session_state.search_job = job.id
+
+    if job and not job.finished:
+        with st.status(f"Go! {msg}", expanded=True):
+            st.fragment(show_job_progress, run_every=progress_interval)(job.id)
+
+    elif job:
+        show_job_results(job)
+
+        # Where did the time go?  The finished search's stage times and counts, also as a JSON metrics file
+        with st.sidebar.expander(f"Metrics of search job {job.id}"):
+            st.text('\n'.join(job.metrics.report( )))
+            st.download_button("Download the metrics as JSON", json.dumps(job.metrics.as_dict( ), indent=2), file_name=f"metrics-{job.id}.json", mime='application/json', key='metrics_download_button')
+
+        # Write the best match score, match and path of every row back into the selected worksheet, once per job
+        if job.state == 'done' and job.settings and job.settings['write_back_column'] and state('written_back_job') != job.id:
+            write_back_results(job.rows, job.settings)
+            st.session_state.written_back_job = job.id